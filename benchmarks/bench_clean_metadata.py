@@ -0,0 +1,67 @@
+"""
+metadata_utils.clean_metadata: before vs after precompiling the junk patterns.
+
+  before:   re.sub(pattern_string, ...) for each of config.JUNK_KEYWORDS
+  compiled: the precompiled pattern pipeline (clean_metadata without its cache)
+  memoized: clean_metadata as called in a run (each title cleaned several times)
+
+Run from the repo root:
+  python benchmarks/bench_clean_metadata.py [--rounds 200]
+The script first checks that every version gives the same output on the corpus.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import metadata_utils
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "youtube_titles.txt")
+CALLS_PER_TITLE = 5  # extract_professional_metadata, get_cover (x2), cover repair (x2)
+
+def clean_metadata_before(text):
+    """The original implementation (inline '(?i)' dropped so it runs on Python 3.11+)."""
+    if not text:
+        return ""
+    for pattern in config.JUNK_KEYWORDS:
+        text = re.sub(pattern.replace('(?i)', ''), '', text, flags=re.IGNORECASE)
+    text = re.sub(r'\s+', ' ', text).strip(' -–—|')
+    return text
+
+def corpus_strings():
+    with open(CORPUS, encoding="utf-8") as f:
+        titles = [line.strip() for line in f if line.strip()]
+    # Artist and title halves are cleaned too
+    strings = list(titles)
+    for title in titles:
+        strings.extend(re.split(r' [-–—|:] ', title, maxsplit=1))
+    return strings
+
+def timed(func, strings, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in strings:
+            for _ in range(CALLS_PER_TITLE):
+                func(text)
+    return (time.perf_counter() - start) / (rounds * len(strings) * CALLS_PER_TITLE) * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    strings = corpus_strings()
+    compiled = metadata_utils.clean_metadata.__wrapped__
+    mismatches = [s for s in strings if clean_metadata_before(s) != compiled(s)]
+    if mismatches:
+        sys.exit(f"Output differs for: {mismatches[:5]}")
+    print(f"{len(strings)} strings, identical output. {CALLS_PER_TITLE} calls per string per round.")
+
+    metadata_utils.clean_metadata.cache_clear()
+    for name, func in (("before", clean_metadata_before), ("compiled", compiled),
+                       ("memoized", metadata_utils.clean_metadata)):
+        print(f"  {name:<9} {timed(func, strings, args.rounds):7.2f} µs/call")
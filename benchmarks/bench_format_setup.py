@@ -0,0 +1,92 @@
+"""
+Per-track setup cost of the download stage: before vs after the format pool.
+
+  before: copy.deepcopy(info) + new YoutubeDL(fmt_opts) per format
+  after:  ydl_pool.isolate_info(info) + pooled YoutubeDL per format
+
+Run from the repo root:
+  python benchmarks/bench_format_setup.py [--tracks 200] [--info video.info.json]
+(--info takes a real dict from 'yt-dlp -j URL'; otherwise a synthetic one of similar size is used)
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+import config
+import ydl_pool
+
+OUTPUT = "/tmp/bench"
+FORMATS = [config.AUDIO_FORMAT, config.VIDEO_FORMAT]  # "both" mode
+
+def opts_for(fmt, output_path):
+    opts = {'quiet': True, 'no_warnings': True, 'outtmpl': f'{output_path}/%(title)s.%(ext)s'}
+    if fmt == config.VIDEO_FORMAT:
+        opts['format'] = 'bestvideo+bestaudio/best'
+        opts['merge_output_format'] = 'mp4'
+    else:
+        opts['format'] = 'bestaudio[ext=m4a]/bestaudio/best'
+        opts['postprocessors'] = [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'm4a'}]
+    return opts
+
+def synthetic_info():
+    """Roughly the shape and size of a YouTube info dict (formats, thumbnails, captions)."""
+    headers = {'User-Agent': config.USER_AGENT, 'Accept': '*/*', 'Accept-Language': 'en-us,en;q=0.5'}
+    formats = [{
+        'format_id': str(100 + i), 'ext': 'mp4' if i % 2 else 'webm', 'url': 'https://rr1.googlevideo.com/' + 'x' * 900,
+        'width': 1920, 'height': 1080, 'tbr': 1000.0 + i, 'http_headers': dict(headers),
+        'fragments': [{'url': f'https://rr1.googlevideo.com/seg/{j}', 'duration': 5.0} for j in range(20)],
+    } for i in range(60)]
+    captions = {f'l{i}': [{'ext': ext, 'url': 'https://www.youtube.com/api/timedtext?' + 'y' * 300}
+                          for ext in ('json3', 'srv1', 'srv2', 'srv3', 'ttml', 'vtt')] for i in range(150)}
+    return {
+        'id': 'dQw4w9WgXcQ', 'title': 'Benchmark Track', 'ext': 'mp4', 'duration': 213,
+        'formats': formats, 'requested_formats': [dict(formats[-1]), dict(formats[-2])],
+        'thumbnails': [{'url': f'https://i.ytimg.com/vi/x/{i}.jpg', 'id': str(i)} for i in range(40)],
+        'automatic_captions': captions, 'http_headers': headers,
+    }
+
+def before(info, _pool):
+    for fmt in FORMATS:
+        video_copy = copy.deepcopy(info)
+        with yt_dlp.YoutubeDL(opts_for(fmt, OUTPUT)) as ydl:
+            ydl.prepare_filename(video_copy)
+
+def after(info, pool):
+    for fmt in FORMATS:
+        video_copy = ydl_pool.isolate_info(info)
+        pool.get(fmt, OUTPUT).prepare_filename(video_copy)
+
+def measure(func, info, tracks):
+    pool = ydl_pool.FormatPool(opts_for)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(tracks):
+        func(info, pool)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    pool.close()
+    return elapsed / tracks * 1000, peak / 1024
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracks", type=int, default=200)
+    parser.add_argument("--info", help="info dict JSON written by 'yt-dlp -j'")
+    args = parser.parse_args()
+
+    if args.info:
+        with open(args.info, encoding="utf-8") as f: info = json.load(f)
+    else:
+        info = synthetic_info()
+    print(f"Info dict: {len(json.dumps(info)) // 1024} KB as JSON, {len(FORMATS)} formats per track")
+
+    for name, func in (("before", before), ("after", after)):
+        per_track, peak = measure(func, info, args.tracks)
+        print(f"  {name:<6} {per_track:8.2f} ms/track   peak {peak:8.0f} KB")
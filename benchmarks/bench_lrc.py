@@ -0,0 +1,127 @@
+"""
+LRC -> SRT conversion: the old lrc_to_srt vs the single-pass parser.
+
+  before:  the original regex-per-line converter (one stamp per line, no offset)
+  after:   file_processor.lrc_to_srt
+  both:    file_processor.convert_lyrics (normalized LRC + SRT from one parse)
+
+Run from the repo root:
+  python benchmarks/bench_lrc.py [--files 5000] [--dir /app/downloads]
+--dir benchmarks every .lrc file found there; otherwise a synthetic corpus
+(multi-stamp lines, [offset:] headers and enhanced word stamps included) is used.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_processor
+
+WORDS = "love night heart time baby dance light fire rain dream home road sky world feel".split()
+
+def lrc_to_srt_before(lrc_text):
+    """The original implementation."""
+    if not lrc_text:
+        return ""
+    lines = lrc_text.splitlines()
+    srt_output = []
+    index = 1
+    pattern = re.compile(r'\[(\d+):(\d+\.\d+)\](.*)')
+    parsed_lines = []
+    for line in lines:
+        match = pattern.match(line)
+        if match:
+            minutes = int(match.group(1))
+            seconds = float(match.group(2))
+            text = match.group(3).strip()
+            if not text: continue
+            total_seconds = (minutes * 60) + seconds
+            parsed_lines.append((total_seconds, text))
+    if not parsed_lines:
+        return ""
+    for i in range(len(parsed_lines)):
+        start_time = parsed_lines[i][0]
+        end_time = parsed_lines[i+1][0] if i+1 < len(parsed_lines) else start_time + 4
+        def format_time(seconds):
+            msec = int((seconds % 1) * 1000)
+            td_sec = int(seconds % 60)
+            td_min = int((seconds // 60) % 60)
+            td_hr = int(seconds // 3600)
+            return f"{td_hr:02}:{td_min:02}:{td_sec:02},{msec:03}"
+        srt_output.append(f"{index}")
+        srt_output.append(f"{format_time(start_time)} --> {format_time(end_time)}")
+        srt_output.append(parsed_lines[i][1])
+        srt_output.append("")
+        index += 1
+    return "\n".join(srt_output)
+
+def stamp(ms):
+    return f"{ms // 60000:02}:{ms // 1000 % 60:02}.{ms % 1000 // 10:02}"
+
+def synthetic_lrc(rng):
+    lines = ["[ar:Artist]", "[ti:Title]"]
+    if rng.random() < 0.05:
+        lines.append(f"[offset:{rng.choice([-500, 250, 1000])}]")
+    ms = rng.randint(1000, 15000)
+    enhanced = rng.random() < 0.1
+    for _ in range(rng.randint(30, 80)):
+        words = rng.sample(WORDS, rng.randint(3, 7))
+        if enhanced:
+            text = " ".join(f"<{stamp(ms + i * 300)}>{w}" for i, w in enumerate(words))
+        else:
+            text = " ".join(words)
+        stamps = f"[{stamp(ms)}]"
+        if rng.random() < 0.1:  # Repeated chorus line
+            stamps += f"[{stamp(ms + rng.randint(60000, 120000))}]"
+        lines.append(stamps + text)
+        ms += rng.randint(1500, 5000)
+    return "\n".join(lines)
+
+def load_corpus(args):
+    if args.dir:
+        corpus = []
+        for root, _, files in os.walk(args.dir):
+            for name in files:
+                if name.endswith(".lrc"):
+                    with open(os.path.join(root, name), encoding="utf-8", errors="replace") as f:
+                        corpus.append(f.read())
+        return corpus
+    rng = random.Random(42)
+    return [synthetic_lrc(rng) for _ in range(args.files)]
+
+def timed(func, corpus, repeat=3):
+    """Best of `repeat` runs."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = [func(text) for text in corpus]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--dir", help="folder with real .lrc files")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args)
+    lines = sum(text.count("\n") + 1 for text in corpus)
+    print(f"{len(corpus)} files, {lines} lines")
+
+    results = {}
+    for name, func in (("before", lrc_to_srt_before), ("after", file_processor.lrc_to_srt),
+                       ("both", file_processor.convert_lyrics)):
+        elapsed, out = timed(func, corpus)
+        results[name] = out
+        print(f"  {name:<7} {elapsed * 1000:8.1f} ms  ({elapsed / len(corpus) * 1e6:6.1f} µs/file)")
+
+    cues = lambda srt: srt.count(" --> ")
+    before_cues = sum(cues(s) for s in results["before"])
+    after_cues = sum(cues(s) for s in results["after"])
+    print(f"  SRT cues: {before_cues} before, {after_cues} after "
+          f"({after_cues - before_cues} lines recovered from multi-stamp lines)")
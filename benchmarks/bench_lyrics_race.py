@@ -0,0 +1,197 @@
+"""
+Lyrics race against local stub providers: requests sent, wall time and answers.
+
+Every provider URL is pointed at one local HTTP server that answers per provider
+with a hit, a miss or no answer at all (hangs), after a set delay.
+
+  top hit:    LRCLIB answers at once; nothing else should be asked
+  last hit:   only Lyrics.ovh has the lyrics; the others miss quickly
+  hung top:   LRCLIB never answers; the search waits out LYRICS_PROVIDER_TIMEOUT,
+              then Lyrics.ovh wins and no call is left holding a thread
+  load:       many concurrent searches on few provider threads; every one must find
+              its lyrics (no queued call may come back as a spurious miss)
+  limited:    the stub host limited to 1 request/s (like NetEase / QQ) and a short
+              search deadline: calls the race gave up on must not wait for tokens,
+              hold threads or send stale requests after the search returned
+
+Run from the repo root:
+  python benchmarks/bench_lyrics_race.py [--searches 40] [--threads 4]
+Exits with 1 if a check fails.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+config.ENABLE_LOGGING = False
+config.LOG_LEVEL = 3
+config.LYRICS_CACHE_ENABLED = False
+# Keep the host limiter out of the way (except in the 'limited' scenario): this measures the engine
+config.DEFAULT_HOST_RATE_LIMIT = (1000.0, 1000)
+config.DEFAULT_HOST_CONCURRENCY = 256
+config.HTTP_READ_TIMEOUT = 30
+
+import lyrics_engine
+import rate_limiter
+
+URL_KEYS = {
+    "LRCLIB": ["LRCLIB_URL"],
+    "NetEase": ["NETEASE_SEARCH_URL", "NETEASE_LYRIC_URL"],
+    "QQ Music": ["QQ_SEARCH_URL", "QQ_LYRIC_URL"],
+    "Megalyrics": ["MEGALYRICS_URL"],
+    "Gecimi": ["GECIMI_URL"],
+    "Lyrics.ovh": ["OVH_URL"],
+}
+LYRICS = "[00:01.00]la la la"
+
+# First request of a provider, by URL key: (status, body) of a hit and of a miss
+HIT = {
+    "LRCLIB_URL": (200, json.dumps({"syncedLyrics": LYRICS})),
+    "OVH_URL": (200, json.dumps({"lyrics": LYRICS})),
+}
+MISS = {
+    "LRCLIB_URL": (404, "{}"),
+    "NETEASE_SEARCH_URL": (200, "{}"),
+    "QQ_SEARCH_URL": (200, "{}"),
+    "MEGALYRICS_URL": (200, "<r/>"),
+    "GECIMI_URL": (200, "{}"),
+    "OVH_URL": (404, "{}"),
+}
+
+class Stub:
+    """behaviour: {provider: ('hit' | 'miss' | 'hang', delay seconds)}."""
+    def __init__(self):
+        self.behaviour = {}
+        self.requests = Counter()
+        self.received = []  # perf_counter() of every request
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                key = self.path.split("/")[1].split("?")[0]
+                name = next(n for n, keys in URL_KEYS.items() if key in keys)
+                with stub._lock:
+                    stub.requests[name] += 1
+                    stub.received.append(time.perf_counter())
+                kind, delay = stub.behaviour.get(name, ("miss", 0))
+                if kind == "hang":
+                    delay = 30
+                time.sleep(delay)
+                status, body = (HIT if kind == "hit" else MISS)[key]
+                body = body.encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except OSError:
+                    pass  # The client gave up
+
+            do_POST = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        for keys in URL_KEYS.values():
+            for key in keys:
+                setattr(config, key, f"http://127.0.0.1:{self.server.server_port}/{key}")
+
+def scenario(stub, behaviour, searches=1, threads=None, rate=(1000.0, 1000)):
+    """
+    Runs `searches` concurrent lookups on a fresh engine, with `rate` (requests/s, burst)
+    for the stub host. Returns (results, wall, requests, drain, late requests).
+    """
+    config.DOWNLOAD_DIR = tempfile.mkdtemp()  # Fresh provider health
+    config.LYRICS_PROVIDER_THREADS = threads or 16
+    limiter = rate_limiter.get_limiter()
+    limiter.rates["127.0.0.1"] = rate
+    limiter._buckets.pop("127.0.0.1", None)
+    engine = lyrics_engine.LyricsEngine()
+    stub.behaviour = behaviour
+    stub.requests.clear()
+    stub.received.clear()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=searches) as pool:
+        results = list(pool.map(lambda i: engine.lookup("Zq", f"Song {i}", 200), range(searches)))
+    returned = time.perf_counter()
+    wall = returned - start
+    requests = dict(stub.requests)
+
+    # Abandoned calls still running would keep the provider threads busy
+    engine._executor.shutdown(wait=True)
+    drain = time.perf_counter() - returned
+    # One sent right as the search gave up may still be on its way; anything later is stale
+    time.sleep(0.2)
+    late = sum(1 for t in stub.received if t > returned + 0.1)
+    return results, wall, requests, drain, late
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--searches", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    stub = Stub()
+    failed = []
+
+    def check(label, ok):
+        print(f"    [{'ok' if ok else 'FAIL'}] {label}")
+        if not ok:
+            failed.append(label)
+
+    print(f"LYRICS_HEDGE_DELAY={config.LYRICS_HEDGE_DELAY}s, LYRICS_PROVIDER_TIMEOUT={config.LYRICS_PROVIDER_TIMEOUT}s")
+
+    results, wall, requests, drain, late = scenario(stub, {"LRCLIB": ("hit", 0.05)})
+    print(f"  top hit:   {wall:6.2f}s  requests {requests}")
+    check("LRCLIB answers", results[0] == (LYRICS, "LRCLIB"))
+    check("no other provider asked", sum(requests.values()) == 1)
+
+    results, wall, requests, drain, late = scenario(stub, {name: ("miss", 0.05) for name in URL_KEYS}
+                                                          | {"Lyrics.ovh": ("hit", 0.05)})
+    print(f"  last hit:  {wall:6.2f}s  requests {requests}")
+    check("Lyrics.ovh answers", results[0] == (LYRICS, "Lyrics.ovh"))
+    check("misses start the next provider without waiting for the hedge delay",
+          wall < config.LYRICS_HEDGE_DELAY * 2)
+
+    results, wall, requests, drain, late = scenario(stub, {"LRCLIB": ("hang", 0), "Lyrics.ovh": ("hit", 0.05)})
+    print(f"  hung top:  {wall:6.2f}s  requests {requests}  threads free after {drain:.2f}s")
+    check("Lyrics.ovh answers", results[0] == (LYRICS, "Lyrics.ovh"))
+    check("search ends at the provider timeout", wall < config.LYRICS_PROVIDER_TIMEOUT + 2)
+    check("no call left running", drain < 1)
+
+    results, wall, requests, drain, late = scenario(stub, {name: ("miss", 0.1) for name in URL_KEYS}
+                                                          | {"LRCLIB": ("hit", 0.2)},
+                                                    searches=args.searches, threads=args.threads)
+    hits = sum(1 for lyrics, _ in results if lyrics)
+    print(f"  load:      {wall:6.2f}s  {args.searches} searches on {args.threads} threads, "
+          f"{hits} found, requests {requests}")
+    check("every search finds its lyrics", hits == args.searches)
+    check("at most one request per search and provider", all(n <= args.searches for n in requests.values()))
+
+    deadline = config.LYRICS_SEARCH_DEADLINE
+    config.LYRICS_SEARCH_DEADLINE = 3
+    results, wall, requests, drain, late = scenario(stub, {name: ("miss", 0.05) for name in URL_KEYS},
+                                                    searches=4, threads=args.threads, rate=(1.0, 1))
+    config.LYRICS_SEARCH_DEADLINE = deadline
+    print(f"  limited:   {wall:6.2f}s  4 searches at 1 req/s, requests {requests}, "
+          f"threads free after {drain:.2f}s, {late} requests after the searches returned")
+    check("searches end at the deadline", wall < 3 + 1)
+    check("abandoned calls stop waiting for tokens", drain < 1)
+    check("no stale request after the searches returned", late == 0)
+
+    sys.exit(1 if failed else 0)
@@ -12,6 +12,112 @@ USER_AGENT = (
     "Chrome/91.0.4472.124 Safari/537.36"
 )
 
+# HTTP Client (shared by the lyrics and cover engines)
+HTTP_CONNECT_TIMEOUT = 4     # Seconds to establish a connection
+HTTP_READ_TIMEOUT = TIMEOUT  # Seconds to wait for the server between bytes
+HTTP_POOL_HOSTS = 16         # Hosts with a keep-alive pool
+HTTP_POOL_SIZE = 16          # Keep-alive connections per host (>= LYRICS_PROVIDER_THREADS)
+HTTP_RETRIES = 2             # Retries for idempotent requests (connection errors, 500/502/504, 429/503)
+HTTP_BACKOFF = 0.5           # Retry delays: 0.5s, 1s, 2s ... plus up to HTTP_BACKOFF_JITTER random seconds
+HTTP_BACKOFF_JITTER = 0.5
+HTTP2_ENABLED = False        # Needs 'pip install httpx[http2]'; falls back to HTTP/1.1 without it
+
+# Concurrency
+# 1 = Serial (one task, one track at a time)
+# >1 = Fan songs.txt tasks and playlist entries out across a thread pool
+MAX_WORKERS = 1
+
+# Max simultaneous requests per host (replaces the fixed 1s sleep between downloads)
+# Keys match the host itself or any of its subdomains.
+HOST_CONCURRENCY = {
+    "youtube.com": 2,
+    "googlevideo.com": 3,
+    "lrclib.net": 4,
+    "music.163.com": 2,
+    "c.y.qq.com": 2,
+    "itunes.apple.com": 2,
+}
+DEFAULT_HOST_CONCURRENCY = 4
+
+# Requests per second per host: (rate, burst). A token bucket shared by every engine and worker.
+HOST_RATE_LIMITS = {
+    "youtube.com": (2.0, 4),
+    "googlevideo.com": (10.0, 10),
+    "lrclib.net": (5.0, 5),
+    "music.163.com": (1.0, 2),
+    "c.y.qq.com": (1.0, 2),
+    "itunes.apple.com": (0.33, 3),  # iTunes Search allows ~20 calls per minute
+}
+DEFAULT_HOST_RATE_LIMIT = (5.0, 5)
+
+# Adaptive Backoff (on 429/503 or when a host keeps failing)
+RATE_BACKOFF_BASE = 2        # Seconds paused after the first throttle without Retry-After (doubles each time)
+RATE_BACKOFF_MAX = 300       # Longest pause, even if Retry-After asks for more
+RATE_MIN_SCALE = 0.1         # A throttled host never drops below 10% of its configured rate
+RATE_ERROR_THRESHOLD = 0.5   # Slow a host down once about half its recent requests fail
+
+# Staged Pipeline (resolve -> enrich -> download -> tag)
+# Tracks flow through stages joined by bounded queues, so a slow lyrics
+# mirror no longer blocks the next download. Replaces the MAX_WORKERS track pool.
+PIPELINE_ENABLED = False
+PIPELINE_WORKERS = {
+    "resolve": 2,   # yt-dlp metadata (extract_info)
+    "enrich": 4,    # Lyrics + Cover lookups
+    "download": 2,  # yt-dlp download + FFmpeg + tags (written right after FFmpeg)
+    "tag": 1,       # Sidecars + Registry
+}
+PIPELINE_QUEUE_SIZE = 8  # Max tracks waiting in front of each stage
+
+# Batch Metadata Resolution
+# Playlists: full metadata for upcoming tracks is fetched this many at a time
+# (reusing one yt-dlp extractor per thread) while the current track downloads.
+RESOLVE_WORKERS = 4
+
+# Lyrics Search
+# True = Query providers concurrently; the highest-ranked one that answers wins
+# False = Try providers one after another (original behaviour)
+LYRICS_RACE = True
+LYRICS_HEDGE_DELAY = 1.0      # Seconds a provider gets before the next one is started as well (a miss starts it at once)
+LYRICS_PROVIDER_TIMEOUT = 8   # Seconds per provider once it runs (including its second-hop request)
+LYRICS_SEARCH_DEADLINE = 15   # Seconds for the whole search
+LYRICS_PROVIDER_THREADS = 16  # Shared threads for blocking provider requests
+
+# Lyrics Provider Health (stored in DOWNLOAD_DIR/CACHE_SUBDIR, kept across runs)
+PROVIDER_STATS_FILE = "providers.json"
+PROVIDER_STATS_DUMP = "providers-summary.json"  # Written at the end of every run (for dashboards)
+PROVIDER_WINDOW = 200               # Recent calls used for hit/error rates and latency percentiles
+PROVIDER_MIN_SAMPLES = 20           # Recent calls needed before a provider can be demoted
+PROVIDER_DEMOTE_ERROR_RATE = 0.5    # Move a provider to the back when half its recent calls fail...
+PROVIDER_DEMOTE_HIT_RATE = 0.02     # ...or when it almost never finds anything
+PROVIDER_BREAKER_ERRORS = 5         # Errors in a row before a provider is skipped entirely
+PROVIDER_BREAKER_COOLDOWN = 3600    # Seconds before a skipped provider is probed again...
+PROVIDER_BREAKER_MAX_COOLDOWN = 24 * 3600  # ...doubling after each failed probe, up to this
+PROVIDER_SAVE_EVERY = 20            # Calls between writes of providers.json
+
+# Caches (stored in DOWNLOAD_DIR/CACHE_SUBDIR)
+CACHE_SUBDIR = ".cache"
+
+# Lyrics Cache
+LYRICS_CACHE_ENABLED = True
+LYRICS_CACHE_FILE = "lyrics.sqlite"
+LYRICS_CACHE_DURATION_BUCKET = 5                 # Seconds; durations in the same bucket share an entry
+LYRICS_CACHE_NEGATIVE_TTL = 7 * 24 * 3600        # Retry tracks without lyrics after a week
+LYRICS_CACHE_MAX_AGE = 180 * 24 * 3600           # Drop any entry older than this
+LYRICS_CACHE_MAX_BYTES = 50 * 1024 * 1024        # Evict least recently used entries above this
+
+# Cover Cache (shared across folders, keyed by iTunes query and artwork URL)
+COVER_CACHE_ENABLED = True
+COVER_CACHE_FILE = "covers.sqlite"
+COVER_CACHE_BLOB_DIR = "covers"
+COVER_CACHE_NEGATIVE_TTL = 7 * 24 * 3600         # Retry searches with no results after a week
+COVER_CACHE_MAX_BYTES = 200 * 1024 * 1024        # Evict least recently used images above this
+
+# Library Index (path, size, mtime and tags of every file; only changed files are re-read)
+LIBRARY_INDEX_FILE = "library.sqlite"
+SCAN_THREADS = 8       # Directories listed in parallel (helps a lot on network storage)
+SCAN_PROCESSES = 4     # Processes parsing changed files (0 = parse in the scanning thread)
+SCAN_CHUNK_SIZE = 64   # Files handed to a parser process at once
+
 # API Endpoints
 LRCLIB_URL = "https://lrclib.net/api/get"
 NETEASE_SEARCH_URL = "http://music.163.com/api/search/get/web"
@@ -51,8 +157,18 @@ MAX_LOG_FOLDER_BYTES = 1 * 1024 * 1024 # 1MB limit
 
 # Metadata Keys
 YTID_KEY = "----:com.apple.iTunes:YTID"
+TAG_PADDING = 128 * 1024  # Free bytes kept after the tags so later edits don't rewrite the file
+TAG_INPLACE_MAX = 1024 * 1024  # Fresh downloads only: tags that outgrow the padding are resized in place if at most this much follows
 
 REGISTRY_FILE = ".registry.json"
+REGISTRY_COMPACT_EVERY = 500  # Journal entries before .registry.json is rewritten
+REGISTRY_FLUSH_EVERY = 25     # Group commit: flush after this many new entries...
+REGISTRY_FLUSH_INTERVAL = 10  # ...or this many seconds (a killed run loses at most this window)
+
+# Crash Recovery (tracks in flight are recorded in DOWNLOAD_DIR/CACHE_SUBDIR/JOB_JOURNAL_FILE)
+JOB_JOURNAL_FILE = "jobs.json"
+RESUME_INTERRUPTED = True  # False = delete the partial files of interrupted tracks instead
+RESUME_ATTEMPTS = 3        # Give up on a track (and clean up) after this many resumes
 
 # Download Mode
 # Options: "audio", "video", "both"
@@ -62,6 +178,12 @@ DOWNLOAD_MODE = "audio"
 AUDIO_FORMAT = "m4a"
 VIDEO_FORMAT = "mp4"
 
+# Audio Stream Copy
+# True = Download the audio-only stream; native AAC is saved without re-encoding,
+#        other codecs (e.g. Opus) are still transcoded to AUDIO_FORMAT
+# False = Always run FFmpegExtractAudio (original behaviour)
+AUDIO_STREAM_COPY = True
+
 # Logic helper (Updated)
 def get_extensions(override_mode=None):
     """
@@ -87,5 +209,23 @@ SKIP_LIBRARY_SCAN = False  # Set to True to skip the entire scan at the end
 REPAIR_LYRICS = True       # Try to find missing .lrc/.srt files
 REPAIR_COVERS = True       # Try to find missing embedded covers or cover.jp
 
+# Library Repair (offline classification first, then online lookups; state in DOWNLOAD_DIR/CACHE_SUBDIR)
+REPAIR_WORKERS = 4                   # Files looked up online at once (the rate limiter still paces each host)
+REPAIR_STATE_FILE = "repair.json"
+REPAIR_RETRY_AFTER = 7 * 24 * 3600   # Files with nothing found online are searched again after a week
+REPAIR_MAX_ONLINE = 0                # Online lookups per run (0 = no limit); the rest waits for the next run
+REPAIR_SAVE_EVERY = 20               # Lookups between writes of repair.json
+
+# Task Manifest (songs.txt lines and the entries they resolved to, stored in DOWNLOAD_DIR/CACHE_SUBDIR)
+# Unchanged lines skip the YouTube search/listing; playlists are listed again after the interval.
+TASK_MANIFEST_FILE = "tasks.json"
+PLAYLIST_REFRESH_INTERVAL = 24 * 3600  # Seconds (0 = list every playlist on every run)
+TASK_MANIFEST_SAVE_EVERY = 50          # Resolved tasks between writes of tasks.json...
+TASK_MANIFEST_SAVE_INTERVAL = 30       # ...or seconds (a killed run only re-resolves what it lost)
+
+# Run Planner (python main.py --plan)
+RUN_STATS_FILE = "runs.json"  # Throughput of past runs (stored in DOWNLOAD_DIR/CACHE_SUBDIR)
+RUN_STATS_KEEP = 20           # Recent runs the estimates are based on
+
 # Auto-Update
 AUTO_UPDATE_YTDLP = True  # Set to True to check for yt-dlp updates on every run
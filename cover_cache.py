@@ -0,0 +1,149 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import config
+import logger
+
+class CoverCache:
+    """
+    Shared cover-art cache (DOWNLOAD_DIR/.cache), used by every folder.
+    - Query index: iTunes search term -> artwork URL + artist (or a negative entry).
+    - Blob store: artwork URL -> processed JPEG, stored once per content hash.
+    Blobs are evicted least-recently-used first once COVER_CACHE_MAX_BYTES is exceeded.
+    """
+    def __init__(self, cache_dir=None):
+        cache_dir = cache_dir or os.path.join(config.DOWNLOAD_DIR, config.CACHE_SUBDIR)
+        self.blob_dir = os.path.join(cache_dir, config.COVER_CACHE_BLOB_DIR)
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, config.COVER_CACHE_FILE), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS queries (
+                term TEXT PRIMARY KEY,
+                artwork_url TEXT,
+                artist_name TEXT,
+                created_at REAL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT,
+                size INTEGER,
+                accessed_at REAL
+            )
+        """)
+        self._conn.commit()
+
+        self.counters = {"query_hits": 0, "query_misses": 0, "blob_hits": 0, "blob_misses": 0}
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT sha256, size FROM blobs)").fetchone()[0]
+
+    # --- Query Index ---
+
+    def get_query(self, term):
+        """
+        Returns (artwork_url, artist_name) for a cached hit, (None, None) for a
+        cached miss still within its TTL, or None if iTunes must be asked.
+        """
+        key = term.lower().strip()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT artwork_url, artist_name, created_at FROM queries WHERE term = ?", (key,)).fetchone()
+
+            if row is None or (row[0] is None and time.time() - row[2] > config.COVER_CACHE_NEGATIVE_TTL):
+                self.counters["query_misses"] += 1
+                return None
+
+            self.counters["query_hits"] += 1
+            return row[0], row[1]
+
+    def put_query(self, term, artwork_url, artist_name=None):
+        """Stores a search result (artwork_url=None records 'no results')."""
+        key = term.lower().strip()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO queries (term, artwork_url, artist_name, created_at) VALUES (?, ?, ?, ?)",
+                (key, artwork_url, artist_name, time.time()))
+            self._conn.commit()
+
+    # --- Blob Store ---
+
+    def _blob_path(self, sha):
+        return os.path.join(self.blob_dir, sha[:2], f"{sha}.jpg")
+
+    def get_blob(self, url):
+        """Returns the processed JPEG for an artwork URL, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256 FROM blobs WHERE url = ?", (url,)).fetchone()
+            if row:
+                try:
+                    with open(self._blob_path(row[0]), "rb") as f:
+                        data = f.read()
+                    self._conn.execute("UPDATE blobs SET accessed_at = ? WHERE url = ?", (time.time(), url))
+                    self._conn.commit()
+                    self.counters["blob_hits"] += 1
+                    return data
+                except OSError:
+                    # File vanished: forget the entry
+                    self._conn.execute("DELETE FROM blobs WHERE url = ?", (url,))
+                    self._conn.commit()
+
+            self.counters["blob_misses"] += 1
+            return None
+
+    def put_blob(self, url, data):
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(sha)
+        with self._lock:
+            is_new = not os.path.exists(path)
+            if is_new:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f: f.write(data)
+                os.replace(tmp_path, path)
+                self._total_bytes += len(data)
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO blobs (url, sha256, size, accessed_at) VALUES (?, ?, ?, ?)",
+                (url, sha, len(data), time.time()))
+            self._conn.commit()
+
+            if self._total_bytes > config.COVER_CACHE_MAX_BYTES:
+                self._evict()
+
+    def _evict(self):
+        """Deletes least recently used blobs until under the size limit. Caller holds the lock."""
+        rows = self._conn.execute(
+            "SELECT sha256, size, MAX(accessed_at) AS last FROM blobs GROUP BY sha256 ORDER BY last").fetchall()
+        removed = 0
+        for sha, size, _ in rows:
+            if self._total_bytes <= config.COVER_CACHE_MAX_BYTES:
+                break
+            self._conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha,))
+            try: os.remove(self._blob_path(sha))
+            except OSError: pass
+            self._total_bytes -= size
+            removed += 1
+        self._conn.commit()
+        logger.log(5, f"   - [CoverCache] Evicted {removed} covers.")
+
+    def report(self):
+        c = self.counters
+        logger.log(4, f"[CoverCache] Queries: {c['query_hits']} hits / {c['query_misses']} misses, "
+                      f"Images: {c['blob_hits']} hits / {c['blob_misses']} misses "
+                      f"({self._total_bytes // 1024} KB stored)")
+
+# Global Instance (Shared by every CoverEngine)
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CoverCache()
+        return _cache
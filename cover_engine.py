@@ -1,13 +1,15 @@
 import os
-import requests
+import threading
 import config
 import image_processor
 import metadata_utils
+import http_client
+import cover_cache
 
 class CoverEngine:
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({'User-Agent': config.USER_AGENT})
+        self.session = http_client.get_session()
+        self.cache = cover_cache.get_cache() if config.COVER_CACHE_ENABLED else None
 
     def get_cover(self, artist, title, album, folder_path, yt_thumb_url):
         # 1. Clean inputs
@@ -34,11 +36,7 @@ class CoverEngine:
 
         # 6. YouTube Fallback (Only if we have a URL)
         if not image_data and yt_thumb_url:
-            try:
-                r = self.session.get(yt_thumb_url, timeout=5)
-                if r.status_code == 200:
-                    image_data = image_processor.process_to_square_jpg(r.content)
-            except: pass
+            image_data = self._fetch_image(yt_thumb_url)
 
         # 5. Save Logic
         if image_data:
@@ -47,27 +45,32 @@ class CoverEngine:
             if not is_generic:
                 # Save Album Cache
                 cache_path = os.path.join(folder_path, f"Album - {clean_album}.jpg")
-                with open(cache_path, "wb") as f: f.write(image_data)
+                self._write_atomic(cache_path, image_data)
 
                 # Save Folder Icon
                 folder_icon = os.path.join(folder_path, "cover.jpg")
                 if not os.path.exists(folder_icon):
-                    with open(folder_icon, "wb") as f: f.write(image_data)
+                    self._write_atomic(folder_icon, image_data)
 
         return image_data
 
+    def _write_atomic(self, path, data):
+        """Writes via a temp file so parallel workers never read a half-written JPEG."""
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f: f.write(data)
+        os.replace(tmp_path, path)
+
     def _get_itunes_cover(self, artist, title):
         # Strategy A: Strict Search (Artist + Title)
-        data = self._itunes_api_call(f"{artist} {title}")
-        if data and data["resultCount"] > 0:
-            return self._process_itunes_result(data["results"][0])
+        result = self._itunes_lookup(f"{artist} {title}")
+        if result:
+            return self._process_itunes_result(result)
 
         # Strategy B: Relaxed Search (Title Only)
         # We only do this if Strategy A failed
         print(f"     > Strict search failed, trying relaxed search for '{title}'...")
-        data = self._itunes_api_call(title)
-        if data and data["resultCount"] > 0:
-            result = data["results"][0]
+        result = self._itunes_lookup(title)
+        if result:
             # VALIDATION: Only accept if the artist we are looking for
             # is mentioned in the result's artist name
             itunes_artist = result.get("artistName", "").lower()
@@ -78,6 +81,31 @@ class CoverEngine:
 
         return None
 
+    def _itunes_lookup(self, term):
+        """
+        Returns the first iTunes result ({artworkUrl100, artistName}) or None.
+        Answers, including 'no results', come from the shared cache when possible.
+        """
+        if self.cache:
+            cached = self.cache.get_query(term)
+            if cached is not None:
+                artwork_url, artist_name = cached
+                if not artwork_url:
+                    return None
+                return {"artworkUrl100": artwork_url, "artistName": artist_name or ""}
+
+        data = self._itunes_api_call(term)
+        if not data:
+            return None # Network/API error: don't cache
+
+        result = data["results"][0] if data.get("resultCount", 0) > 0 else None
+        if self.cache:
+            if result and result.get("artworkUrl100"):
+                self.cache.put_query(term, result["artworkUrl100"], result.get("artistName"))
+            elif not result:
+                self.cache.put_query(term, None)
+        return result
+
     def _itunes_api_call(self, term):
         """Helper for the raw API request."""
         try:
@@ -90,6 +118,23 @@ class CoverEngine:
         """Helper to download and process the image from a result."""
         try:
             img_url = result["artworkUrl100"].replace("100x100bb", "1000x1000bb")
-            img_r = self.session.get(img_url, timeout=5)
-            return image_processor.process_to_square_jpg(img_r.content)
+            return self._fetch_image(img_url)
         except: return None
+
+    def _fetch_image(self, url):
+        """Downloads and squares an image, going through the blob cache."""
+        if self.cache:
+            data = self.cache.get_blob(url)
+            if data:
+                return data
+
+        try:
+            r = self.session.get(url, timeout=5)
+            if r.status_code != 200:
+                return None
+            data = image_processor.process_to_square_jpg(r.content)
+        except: return None
+
+        if data and self.cache:
+            self.cache.put_blob(url, data)
+        return data
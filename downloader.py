@@ -1,5 +1,5 @@
 import os
-import time
+import threading
 import yt_dlp
 import config
 import metadata_utils
@@ -7,14 +7,84 @@ import file_processor
 import logger
 import cover_engine
 import re
-import copy
+import rate_limiter
+import pipeline
+import resolver
+import ydl_pool
+import job_journal
+import task_manifest
+import resource
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Format pool key for native AAC audio (downloaded without FFmpegExtractAudio)
+AUDIO_COPY = "m4a-copy"
+
+# yt-dlp's FFmpeg steps add '-movflags +faststart', a second pass that moves moov in front
+# of the media data. Audio files keep moov at the end instead: the FFmpeg output is written
+# once and EmbedTagsPP then only has to extend moov (see file_processor.TagUpdate).
+AUDIO_FFMPEG_ARGS = {
+    'extractaudio+ffmpeg_o': ['-movflags', '-faststart'],
+    'fixupm4a+ffmpeg_o': ['-movflags', '-faststart'],
+}
+
+def extract_id_from_url(url):
+    """Extracts the 11-char ID without hitting the network."""
+    pattern = r"(?:v=|\/)([0-9A-Za-z_-]{11}).*"
+    match = re.search(pattern, url)
+    return match.group(1) if match else None
+
+def is_playlist(query):
+    """Checks if the query is a YouTube playlist."""
+    return "list=" in query.lower()
+
+class TrackJob:
+    """State for one track as it moves through resolve -> enrich -> download -> tag."""
+    def __init__(self, entry, original_query, output_path, override_mode=None):
+        self.entry = entry
+        self.ytid = entry.get('id')
+        self.original_query = original_query
+        self.output_path = output_path
+        self.override_mode = override_mode
+
+        # Filled by the resolve stage (or the BatchResolver ahead of time)
+        self.resolved = False
+        self.video = None
+        self.artist = None
+        self.title = None
+        self.duration = 0
+        self.album = 'Unknown'
+        self.yt_thumb = None
+
+        # Filled by the enrich stage (before the download, so tags go in with it)
+        self.lyrics = None
+        self.cover_data = None
+
+        # Filled by the download stage: [(ext, final_file), ...] and the files already tagged
+        self.files = []
+        self.tagged = set()
 
 class Downloader:
-    def __init__(self, lyrics_engine, registry, existing_ids):
+    def __init__(self, lyrics_engine, registry, existing_ids, library_index=None):
         self.lyrics_engine = lyrics_engine
         self.registry = registry
         self.existing_ids = existing_ids
+        self.library_index = library_index
         self.cover_engine = cover_engine.CoverEngine()
+        self.limiter = rate_limiter.get_limiter()
+
+        # Concurrency state
+        # _claims holds the IDs and output files workers are busy with,
+        # so two threads never download the same track at the same time.
+        self._lock = threading.Lock()
+        self._claims = set()
+        self._name_ydls = {}
+        self._track_pool = None
+        self.pipeline = None
+        if config.PIPELINE_ENABLED:
+            self.pipeline = self._build_pipeline()
+        elif config.MAX_WORKERS > 1:
+            self._track_pool = ThreadPoolExecutor(max_workers=config.MAX_WORKERS, thread_name_prefix="track")
 
         self.base_opts = {
             'noplaylist': False,
@@ -22,14 +92,30 @@ class Downloader:
             'extract_flat': 'in_playlist',
             'quiet': True,
             'no_warnings': True,
+            'logger': rate_limiter.YdlLogger(self.limiter),  # Feeds ignored errors (429s) back to the limiter
         }
 
+        # Reused metadata extractors and per-format downloaders, shared by every mode
+        self.resolver = resolver.BatchResolver(self.base_opts, self.limiter)
+        self.format_pool = ydl_pool.FormatPool(self._get_opts_for_format, self._setup_format_ydl)
+        self.journal = job_journal.JobJournal()
+        self.manifest = task_manifest.TaskManifest()
+        self.audio_stats = {path: {"tracks": 0, "cpu": 0.0, "bytes": 0} for path in ("copy", "transcode")}
+
+        # Run totals for the planner: tracks finished, queries resolved, {playlist: {'entries', 'new'}}
+        self.run_counts = Counter()
+        self.playlist_sizes = {}
+
     def _get_opts_for_format(self, fmt, output_path):
         """Generates yt-dlp options for a specific format (audio/video)."""
         opts = self.base_opts.copy()
         opts['outtmpl'] = f'{output_path}/%(title)s.%(ext)s'
 
-        if fmt == config.VIDEO_FORMAT:
+        if fmt == AUDIO_COPY:
+            # Native AAC stream: saved as is (yt-dlp only remuxes DASH m4a with a stream copy)
+            opts['format'] = 'bestaudio[ext=m4a]'
+            opts['postprocessor_args'] = AUDIO_FFMPEG_ARGS
+        elif fmt == config.VIDEO_FORMAT:
             opts['format'] = 'bestvideo+bestaudio/best'
             opts['merge_output_format'] = 'mp4'
         else:
@@ -39,17 +125,110 @@ class Downloader:
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'm4a',
             }]
+            opts['postprocessor_args'] = AUDIO_FFMPEG_ARGS
         return opts
 
+    def _setup_format_ydl(self, ydl, fmt):
+        """Audio downloaders get their tags written right after FFmpeg, inside yt-dlp's post-processing."""
+        ydl.add_progress_hook(self._record_intermediate)
+        if fmt in (AUDIO_COPY, config.AUDIO_FORMAT):
+            ydl.add_post_processor(ydl_pool.EmbedTagsPP(ydl), when='post_process')
+
+    def _record_intermediate(self, status):
+        """Progress hook: every file yt-dlp finishes goes into the journal, so a discarded track can remove it."""
+        job = status.get('info_dict', {}).get('__tag_job')
+        if status.get('status') == 'finished' and job and status.get('filename'):
+            self.journal.intermediate(job.ytid, status['filename'])
+
+    def _pick_audio_format(self, video):
+        """
+        Best audio-only stream of a resolved video, native AAC (m4a) first.
+        Returns (format, is_native_aac), or (None, False) if there is no audio-only stream.
+        """
+        audio = [f for f in video.get('formats') or []
+                 if f.get('vcodec') == 'none' and f.get('acodec') != 'none' and f.get('url')]
+        if not audio:
+            return None, False
+
+        def rate(f): return f.get('abr') or f.get('tbr') or 0
+
+        if config.AUDIO_FORMAT == 'm4a':
+            native = [f for f in audio if f.get('ext') == 'm4a' and (f.get('acodec') or '').startswith('mp4a')]
+            if native:
+                return max(native, key=rate), True
+        return max(audio, key=rate), False
+
+    def _record_audio_path(self, path, cpu, size):
+        """ffmpeg CPU seconds (children of this process) and output bytes per audio path."""
+        with self._lock:
+            stats = self.audio_stats[path]
+            stats["tracks"] += 1
+            stats["cpu"] += cpu
+            stats["bytes"] += size
+
+    def report_audio_paths(self):
+        """Logs what each audio path measured (no savings are extrapolated from it)."""
+        copy_stats, transcode_stats = self.audio_stats["copy"], self.audio_stats["transcode"]
+        if not copy_stats["tracks"] and not transcode_stats["tracks"]:
+            return
+
+        for label, stats in (("stream-copied", copy_stats), ("transcoded", transcode_stats)):
+            if stats["tracks"]:
+                logger.log(4, f"[Audio] {stats['tracks']} {label}: {stats['bytes'] / (1024 * 1024):.1f} MB written, "
+                              f"{stats['cpu']:.1f}s ffmpeg CPU.")
+
+    def _claim(self, key):
+        """Reserves an ID or file path for this worker. False if someone else has it."""
+        with self._lock:
+            if key in self._claims:
+                return False
+            self._claims.add(key)
+            return True
+
+    def _release(self, key):
+        with self._lock:
+            self._claims.discard(key)
+
+    def _is_known(self, ytid):
+        """Thread-safe RAM index / Registry check."""
+        with self._lock:
+            if ytid in self.existing_ids:
+                return True
+        return self.registry.is_downloaded(ytid)
+
+    def _build_pipeline(self):
+        """Wires the four track stages together with bounded queues."""
+        workers = config.PIPELINE_WORKERS
+        size = config.PIPELINE_QUEUE_SIZE
+        stages = [
+            pipeline.Stage("resolve", lambda job: self._run_stage(self._resolve, job), workers.get("resolve", 1), size),
+            pipeline.Stage("enrich", lambda job: self._run_stage(self._enrich, job), workers.get("enrich", 1), size),
+            pipeline.Stage("download", lambda job: self._run_stage(self._download, job), workers.get("download", 1), size),
+            pipeline.Stage("tag", lambda job: self._run_stage(self._tag, job, final=True), workers.get("tag", 1), size),
+        ]
+        p = pipeline.Pipeline(stages)
+        p.start()
+        return p
+
+    def shutdown(self):
+        """Stops the worker pool / drains the pipeline (waits for running tracks)."""
+        if self._track_pool:
+            self._track_pool.shutdown(wait=True)
+            self._track_pool = None
+        if self.pipeline:
+            self.pipeline.close()
+            self.pipeline.report()
+            self.pipeline = None
+        self.resolver.close()
+        self.format_pool.close()
+        self.manifest.save()
+        self.report_audio_paths()
+
     def _extract_id_from_url(self, url):
-        """Extracts the 11-char ID without hitting the network."""
-        pattern = r"(?:v=|\/)([0-9A-Za-z_-]{11}).*"
-        match = re.search(pattern, url)
-        return match.group(1) if match else None
+        return extract_id_from_url(url)
 
     def _is_playlist(self, query):
-        """Checks if the query is a YouTube playlist."""
-        return "list=" in query.lower()
+        return is_playlist(query)
 
     def process_query(self, query, target_folder=None, override_mode=None):
         """
@@ -69,131 +248,316 @@ class Downloader:
                     logger.log(5, f"   - [FastSkip] ID {ytid} already in registry.")
                     return
 
-        logger.log(4, f"\n[Downloader] Processing: {query}")
-
         # 2. Determine Output Path
         output_path = target_folder if target_folder else config.DOWNLOAD_DIR
-        if not os.path.exists(output_path):
-            os.makedirs(output_path)
+        os.makedirs(output_path, exist_ok=True)
 
-        search_query = query if query.startswith('http') else f"ytsearch1:{query}"
+        # 3. Initial Scan: unchanged songs.txt lines reuse what they resolved to last time
+        cached = self.manifest.entries(query, target_folder, override_mode)
+        if cached is None:
+            logger.log(4, f"\n[Downloader] Processing: {query}")
 
-        # 3. Initial Scan (Use base options just to get the list)
-        with yt_dlp.YoutubeDL(self.base_opts) as ydl:
-            try:
-                info = ydl.extract_info(search_query, download=False)
-                if not info:
+        try:
+            if cached is not None:
+                video_list = cached
+            else:
+                video_list = self._list_entries(query)
+                if video_list is None:
                     logger.log(3, f"   - Could not access: {query}")
                     return
 
-                video_list = info['entries'] if 'entries' in info else [info]
                 logger.log(4, f"   - Found {len(video_list)} potential track(s).")
+                with self._lock:
+                    self.run_counts["queries"] += 1
+                self.manifest.resolved(query, target_folder, override_mode, video_list,
+                                       playlist=self._is_playlist(query))
+
+            jobs = []
+            for entry in video_list:
+                if not entry: continue
+
+                # Availability Check
+                title = entry.get('title', '')
+                if title in ['[Private video]', '[Deleted video]', None]:
+                    continue
+
+                # Fast Skip Check (RAM/Registry)
+                ytid = entry.get('id')
+                if ytid and self._is_known(ytid):
+                    continue
+
+                # Disk Check (predicted from the flat entry, before any metadata fetch)
+                if self._exists_on_disk(entry, output_path, override_mode):
+                    logger.log(5, f"   - [FastSkip] '{title}' already on disk.")
+                    continue
+
+                job = self._start_job(entry, query, output_path, override_mode)
+                if job:
+                    jobs.append(job)
+
+            if cached is None and self._is_playlist(query):
+                with self._lock:
+                    self.playlist_sizes[query] = {"entries": len(video_list), "new": len(jobs)}
+            elif cached is not None and jobs:
+                logger.log(4, f"\n[Downloader] Processing: {query} ({len(jobs)} of {len(video_list)} known entries left)")
+
+            # Process Tracks
+            # Pipeline mode: hand the tracks to the resolve stage (blocks when the queue is full)
+            # Concurrent mode: fan tracks out to the pool, host limits replace the old sleep
+            # Serial mode: metadata for the batch is fetched concurrently, downloads run one by one
+            if self.pipeline:
+                for job in jobs:
+                    self.pipeline.submit(job)
+            elif self._track_pool:
+                pending = [self._track_pool.submit(self._run_job, job) for job in jobs]
+                # Wait for this query's tracks before reporting it as done
+                for future in pending:
+                    future.result()
+            elif len(jobs) > 1:
+                for job in self.resolver.prefetch(jobs):
+                    self._run_job(job)
+            else:
+                for job in jobs:
+                    self._run_job(job)
 
-                for entry in video_list:
-                    if not entry: continue
-
-                    # Availability Check
-                    title = entry.get('title', '')
-                    if title in ['[Private video]', '[Deleted video]', None]:
-                        continue
+        except Exception as e:
+            logger.log(2, f"   - Critical Downloader Error: {e}")
 
-                    # Fast Skip Check (RAM/Registry)
-                    ytid = entry.get('id')
-                    if ytid and (ytid in self.existing_ids or self.registry.is_downloaded(ytid)):
-                        continue
+    def _list_entries(self, query):
+        """One extract_info call: the flat entries of a playlist, search or video (None if inaccessible)."""
+        search_query = query if query.startswith('http') else f"ytsearch1:{query}"
 
-                    # Process Track (Returns True if download happened)
-                    # We pass 'ydl' but it won't be used for download, only for metadata if needed
-                    did_download = self._download_and_process_track(ydl, entry, query, output_path, override_mode)
+        # Use base options just to get the list
+        with yt_dlp.YoutubeDL(self.base_opts) as ydl:
+            with self.limiter.slot("youtube.com"):
+                info = ydl.extract_info(search_query, download=False)
+        if not info:
+            return None
+        return info['entries'] if 'entries' in info else [info]
+
+    def _exists_on_disk(self, entry, output_path, override_mode):
+        """True if every needed format already exists under the name the flat entry's title predicts."""
+        title = entry.get('title')
+        if not title:
+            return False
 
-                    if did_download:
-                        time.sleep(1)
+        with self._lock:
+            name_ydl = self._name_ydls.get(output_path)
+            if name_ydl is None:
+                name_ydl = yt_dlp.YoutubeDL({'outtmpl': f'{output_path}/%(title)s.%(ext)s', 'quiet': True})
+                self._name_ydls[output_path] = name_ydl
 
-            except Exception as e:
-                logger.log(2, f"   - Critical Downloader Error: {e}")
+        for ext in config.get_extensions(override_mode):
+            predicted = name_ydl.prepare_filename({'id': entry.get('id'), 'title': title, 'ext': ext})
+            if not os.path.exists(os.path.splitext(predicted)[0] + f".{ext}"):
+                return False
+        return True
 
     def _download_and_process_track(self, ydl_unused, entry, original_query, output_path, override_mode=None):
         """
         Internal method.
         Handles Audio, Video, or Both based on config.
+        Runs all stages back to back on the calling thread.
+        """
+        job = self._start_job(entry, original_query, output_path, override_mode)
+        if not job: return False
+        return self._run_job(job)
+
+    def _run_job(self, job):
+        """Runs every stage of a claimed job on the calling thread. True if a download happened."""
+        for func in (self._resolve, self._enrich, self._download):
+            job = self._run_stage(func, job)
+            if not job: return False
+        return self._run_stage(self._tag, job, final=True) is not None
+
+    def _start_job(self, entry, original_query, output_path, override_mode):
+        """Claims the track's ID. Returns None if it has no ID or another worker owns it."""
+        ytid = entry.get('id')
+        if not ytid: return None
+
+        # Another worker (duplicate playlist entry / same song twice) already has it
+        if not self._claim(ytid):
+            logger.log(5, f"   - [FastSkip] ID {ytid} is being processed by another worker.")
+            return None
+        return TrackJob(entry, original_query, output_path, override_mode)
+
+    def _run_stage(self, func, job, final=False):
+        """
+        Runs one stage on a job. If the stage drops the job (returns None or fails)
+        or it was the final stage, the track's ID claim is released.
         """
         try:
-            ytid = entry.get('id')
-            if not ytid: return False
-
-            # 1. Determine what we need to download
-            needed_exts = config.get_extensions(override_mode)
-            download_occurred = False
-
-            # 2. Fetch Metadata (Once for all formats)
-            video_url = entry.get('webpage_url') or entry.get('url') or f"https://www.youtube.com/watch?v={ytid}"
-
-            logger.log(5, f"   - [Network] Fetching metadata: {ytid}")
-
-            # Use a temporary YDL instance just for metadata extraction
-            with yt_dlp.YoutubeDL(self.base_opts) as meta_ydl:
-                video = meta_ydl.extract_info(video_url, download=False)
-
-            if not video: return False
-
-            artist, title = metadata_utils.extract_professional_metadata(video)
-            duration = video.get('duration', 0)
-            album = video.get('album', 'Unknown')
-            yt_thumb = video.get('thumbnail')
-
-            # 3. Loop through required formats (Audio, Video, or Both)
-            for ext in needed_exts:
-                # Create specific options for this format
-                fmt_opts = self._get_opts_for_format(ext, output_path)
-
-                # Create a clean copy of metadata for this iteration
-                # This prevents 'yt-dlp' from polluting the dictionary with state
-                # from the previous format (e.g. m4a download affecting mp4 logic)
-                video_copy = copy.deepcopy(video)
-
-                # Prepare filename
-                with yt_dlp.YoutubeDL(fmt_opts) as fmt_ydl:
-                    # Use video_copy here
-                    temp_filename = fmt_ydl.prepare_filename(video_copy)
-                    final_file = os.path.splitext(temp_filename)[0] + f".{ext}"
-
-                    # Disk Check
-                    if os.path.exists(final_file):
-                        continue
+            result = func(job)
+        except Exception as e:
+            logger.log(2, f"   - Track Error: {e}")
+            result = None
+
+        if result is None or final:
+            self._release(job.ytid)
+        return result
+
+    def _resolve(self, job):
+        """Stage 1: Fetch full metadata (once for all formats)."""
+        # Re-check now that we own the ID (a parallel worker may have just finished it)
+        if self._is_known(job.ytid):
+            return None
+
+        # Metadata may already have been prefetched by the batch resolver
+        if not job.resolved:
+            job.video = self.resolver.resolve_one(job.entry)
+            job.resolved = True
+
+        video = job.video
+        if not video: return None
+
+        job.artist, job.title = metadata_utils.extract_professional_metadata(video)
+        job.duration = video.get('duration', 0)
+        job.album = video.get('album', 'Unknown')
+        job.yt_thumb = video.get('thumbnail')
+        return job
+
+    def _download(self, job):
+        """Stage 3: Download every required format (Audio, Video, or Both), tags included."""
+        # Recorded until tagged, so a killed run can resume or clean up
+        self.journal.begin(job)
+
+        for ext in config.get_extensions(job.override_mode):
+            # Clean copy of metadata for this iteration
+            # This prevents 'yt-dlp' from polluting the dictionary with state
+            # from the previous format (e.g. m4a download affecting mp4 logic)
+            video_copy = ydl_pool.isolate_info(job.video)
+
+            # Audio: fetch the audio-only stream itself (not the merged video).
+            # Native AAC is kept as is, anything else is transcoded by FFmpegExtractAudio.
+            audio_path = None
+            if ext == config.AUDIO_FORMAT and config.AUDIO_STREAM_COPY:
+                audio_fmt, native = self._pick_audio_format(job.video)
+                if audio_fmt:
+                    video_copy.pop('requested_formats', None)
+                    video_copy.update(audio_fmt)
+                    audio_path = "copy" if native else "transcode"
+
+            # Reused downloader for this folder + format (built once per thread)
+            fmt_ydl = self.format_pool.get(AUDIO_COPY if audio_path == "copy" else ext, job.output_path)
+            video_copy['__tag_job'] = job
+
+            # Prepare filename
+            temp_filename = fmt_ydl.prepare_filename(video_copy)
+            final_file = os.path.splitext(temp_filename)[0] + f".{ext}"
+
+            # Another track with the same title is being written right now
+            if not self._claim(final_file):
+                continue
 
-                    # DOWNLOAD
-                    logger.log(4, f"   - Downloading ({ext}): {artist} - {title}")
-                    # Use video_copy here
+            try:
+                # Disk Check
+                if os.path.exists(final_file):
+                    continue
+
+                # DOWNLOAD
+                logger.log(4, f"   - Downloading ({ext}): {job.artist} - {job.title}")
+                self.journal.start_format(job.ytid, ext, final_file)
+                usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+                with self.limiter.slot("googlevideo.com"):
                     fmt_ydl.process_info(video_copy)
-                    download_occurred = True
-
-                    # POST-PROCESS (Lyrics/Cover)
-                    lyrics = self.lyrics_engine.search(artist, title, duration)
-                    cover_data = self.cover_engine.get_cover(artist, title, album, output_path, yt_thumb)
-
-                    # Embed (Function handles extension check internally)
-                    file_processor.embed_metadata(final_file, lyrics=lyrics, ytid=ytid, cover_data=cover_data)
-
-                    # Save sidecars (LRC/SRT)
-                    if lyrics:
-                        base_path = os.path.splitext(final_file)[0]
-                        with open(f"{base_path}.lrc", "w", encoding="utf-8") as f: f.write(lyrics)
-                        srt = file_processor.lrc_to_srt(lyrics)
-                        if srt:
-                            with open(f"{base_path}.srt", "w", encoding="utf-8") as f: f.write(srt)
-
-            # 4. Finalize
-            if download_occurred:
-                self.existing_ids.add(ytid)
-                if self._is_playlist(original_query):
-                    self.registry.add(ytid, ytid)
-                else:
-                    self.registry.add(original_query, ytid)
-                self.registry.save()
-                return True
-
-            return False
+                if audio_path and os.path.exists(final_file):
+                    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+                    cpu = (usage.ru_utime - usage_before.ru_utime) + (usage.ru_stime - usage_before.ru_stime)
+                    self._record_audio_path(audio_path, cpu, os.path.getsize(final_file))
+                job.files.append((ext, final_file))
+                self.journal.finish_format(job.ytid, ext, final_file)
+            finally:
+                self._release(final_file)
+
+        # Nothing new on disk: nothing to enrich or tag
+        if not job.files:
+            self.journal.finish(job.ytid)
+            return None
+        self.journal.downloaded(job.ytid)
+        return job
+
+    def _enrich(self, job):
+        """Stage 2: Lyrics and cover lookups (ahead of the download, see EmbedTagsPP)."""
+        # Every format is on disk already: the download stage would drop the job, so skip the lookups
+        # (job.files is only set for a recovered job, whose files are its own)
+        if not job.files and self._exists_on_disk(job.video, job.output_path, job.override_mode):
+            logger.log(5, f"   - [FastSkip] '{job.artist} - {job.title}' is already on disk.")
+            return None
+
+        job.lyrics = self.lyrics_engine.search(job.artist, job.title, job.duration)
+        job.cover_data = self.cover_engine.get_cover(job.artist, job.title, job.album, job.output_path, job.yt_thumb)
+        return job
+
+    def _tag(self, job):
+        """Stage 4: Write sidecars and record the track in the Registry (tags are usually in already)."""
+        # Sidecar contents: parsed once for every format (normalized LRC + SRT)
+        lrc, srt = file_processor.convert_lyrics(job.lyrics) if job.lyrics else ("", "")
+
+        for ext, final_file in job.files:
+            # Embed unless EmbedTagsPP already did it during the download (or after a resumed run)
+            if final_file not in job.tagged:
+                file_processor.embed_metadata(final_file, lyrics=job.lyrics, ytid=job.ytid, cover_data=job.cover_data)
+
+            # Save sidecars (LRC/SRT)
+            if job.lyrics:
+                base_path = os.path.splitext(final_file)[0]
+                with open(f"{base_path}.lrc", "w", encoding="utf-8") as f: f.write(lrc)
+                if srt:
+                    with open(f"{base_path}.srt", "w", encoding="utf-8") as f: f.write(srt)
+
+            # Keep the library index current so the repair scan needs no disk walk
+            if self.library_index:
+                self.library_index.refresh(final_file)
+
+        # Finalize
+        with self._lock:
+            self.existing_ids.add(job.ytid)
+            self.run_counts["tracks"] += 1
+        if self._is_playlist(job.original_query):
+            self.registry.add(job.ytid, job.ytid)
+        else:
+            self.registry.add(job.original_query, job.ytid)
+        self.registry.save()
+        self.journal.finish(job.ytid)
+        return job
 
-        except Exception as e:
-            logger.log(2, f"   - Track Error: {e}")
-            return False
+    def recover_jobs(self):
+        """
+        Picks up tracks a killed run left half done (see job_journal).
+        - Downloaded but not tagged: straight to lyrics/cover/tagging.
+        - Cut off mid-download: resumed from the partial files, or cleaned up
+          once RESUME_ATTEMPTS is used up (or RESUME_INTERRUPTED is off).
+        """
+        pending = self.journal.pending()
+        if not pending: return
+
+        logger.log(4, f"[Recovery] {len(pending)} interrupted track(s) from the last run.")
+        for ytid, record in pending:
+            # Finished after all (crashed between the Registry and the journal)
+            if self._is_known(ytid):
+                self.journal.finish(ytid)
+                continue
+
+            attempts = self.journal.attempt(ytid)
+            if not config.RESUME_INTERRUPTED or attempts > config.RESUME_ATTEMPTS:
+                logger.log(3, f"   - [Recovery] Discarding '{record.get('title') or ytid}'")
+                job_journal.discard(record)
+                self.journal.finish(ytid)
+                continue
+
+            job = self._start_job(record["entry"], record["query"], record["output_path"], record["override_mode"])
+            if not job: continue
+            job.files = [tuple(f) for f in record["files"] if os.path.exists(f[1])]
+
+            if record["stage"] == "downloaded" and len(job.files) == len(record["files"]):
+                logger.log(4, f"   - [Recovery] Finishing '{record['artist']} - {record['title']}'")
+                job.resolved = True
+                job.artist, job.title = record["artist"], record["title"]
+                job.duration, job.album, job.yt_thumb = record["duration"], record["album"], record["yt_thumb"]
+                job = self._run_stage(self._enrich, job)
+                if job:
+                    self._run_stage(self._tag, job, final=True)
+            else:
+                logger.log(4, f"   - [Recovery] Resuming '{record.get('title') or ytid}'")
+                job_journal.prepare_resume(record)
+                self._run_job(job)
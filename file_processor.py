@@ -1,138 +1,453 @@
 import os
 import re
+import shutil
+import struct
+from collections import namedtuple
+from operator import itemgetter
 import config
 import logger
 from mutagen.mp3 import MP3
 from mutagen.mp4 import MP4, MP4Cover
 from mutagen.id3 import ID3, USLT, TXXX, Encoding
 
+# [mm:ss.xx] / [mm:ss:xx] / [mm:ss] line stamps, [tag:value] headers, <mm:ss.xx> word stamps (enhanced LRC)
+_LRC_STAMP = re.compile(r'\[(\d+):(\d+)(?:[.:](\d+))?\]')
+_LRC_LINE = re.compile(r'^[ \t]*((?:\[\d+:\d+(?:[.:]\d+)?\])+)([^\r\n]*)', re.M)
+_LRC_HEADER = re.compile(r'^[ \t]*\[([A-Za-z]+):([^\]\r\n]*)\][ \t\r]*$', re.M)
+_LRC_WORD_STAMP = re.compile(r'<(\d+):(\d+)(?:[.:](\d+))?>')
+
+def parse_lrc(lrc_text):
+    """
+    Single-pass LRC parser.
+    Returns ([(start_ms, text), ...] sorted by time, {header: value}).
+    - Several stamps on one line ([00:12.00][01:30.00]chorus) give one entry each.
+    - [offset:+/-ms] is applied to every stamp, word stamps included (positive = lyrics come earlier).
+    - Enhanced LRC word stamps (<mm:ss.xx>) and stamped lines without text
+      (line-end markers) are kept; only the SRT drops them.
+    """
+    entries = []
+    headers = {}
+    if not lrc_text:
+        return entries, headers
+
+    # One regex scan over the whole text instead of a match per line
+    for stamp_block, text in _LRC_LINE.findall(lrc_text):
+        text = text.strip()
+        for minutes, seconds, fraction in _LRC_STAMP.findall(stamp_block):
+            entries.append((_stamp_ms(minutes, seconds, fraction), text))
+
+    for key, value in _LRC_HEADER.findall(lrc_text):
+        headers[key.lower()] = value.strip()
+
+    try:
+        offset = int(headers.get('offset', 0))
+    except ValueError:
+        offset = 0
+    if offset:
+        def shift(match):
+            return f"<{_lrc_time(max(0, _stamp_ms(*match.groups()) - offset))}>"
+        entries = [(max(0, ms - offset), _LRC_WORD_STAMP.sub(shift, text) if '<' in text else text)
+                   for ms, text in entries]
+
+    entries.sort(key=itemgetter(0))
+    return entries, headers
+
+def _stamp_ms(minutes, seconds, fraction):
+    ms = (int(minutes) * 60 + int(seconds)) * 1000
+    if fraction:
+        ms += int(fraction[:3].ljust(3, '0'))
+    return ms
+
+def _lrc_time(ms):
+    minutes, ms = divmod(ms, 60000)
+    return f"{minutes:02}:{ms // 1000:02}.{ms % 1000 // 10:02}"
+
+def _srt_time(ms):
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02}:{minutes:02}:{seconds:02},{ms:03}"
+
+def _srt(entries):
+    # Each stamp is formatted once: it is the start of its line and the end of the previous one
+    # End time of the last line is its start + 4 seconds
+    # Word stamps are removed; empty lines aren't shown, they only end the line before them
+    times = [_srt_time(ms) for ms, _ in entries]
+    times.append(_srt_time(entries[-1][0] + 4000))
+    cues = []
+    for i, (_, text) in enumerate(entries):
+        if '<' in text:
+            text = _LRC_WORD_STAMP.sub('', text).strip()
+        if text:
+            cues.append(f"{len(cues) + 1}\n{times[i]} --> {times[i + 1]}\n{text}\n")
+    return "\n".join(cues)
+
+def _lrc(entries, headers):
+    """One stamp per line, sorted, offset already applied."""
+    lines = [f"[{key}:{value}]" for key, value in headers.items() if key != 'offset']
+    for ms, text in entries:
+        lines.append(f"[{_lrc_time(ms)}]{text}")
+    return "\n".join(lines) + "\n"
+
+def convert_lyrics(lrc_text):
+    """
+    Parses once and returns (normalized LRC, SRT).
+    Unsynced (plain) lyrics come back unchanged, with an empty SRT.
+    """
+    entries, headers = parse_lrc(lrc_text)
+    if not entries:
+        return lrc_text or "", ""
+    return _lrc(entries, headers), _srt(entries)
+
 def lrc_to_srt(lrc_text):
     """
     Converts LRC format to SRT format.
     Essential for VLC to display lyrics automatically.
     """
-    if not lrc_text:
-        return ""
-
-    lines = lrc_text.splitlines()
-    srt_output = []
-    index = 1
-
-    # Regex to find [mm:ss.xx] or [mm:ss:xxx]
-    pattern = re.compile(r'\[(\d+):(\d+\.\d+)\](.*)')
-
-    parsed_lines = []
-    for line in lines:
-        match = pattern.match(line)
-        if match:
-            minutes = int(match.group(1))
-            seconds = float(match.group(2))
-            text = match.group(3).strip()
-            if not text: continue # Skip empty lyric lines
-
-            total_seconds = (minutes * 60) + seconds
-            parsed_lines.append((total_seconds, text))
-
-    if not parsed_lines:
-        return ""
-
-    for i in range(len(parsed_lines)):
-        start_time = parsed_lines[i][0]
-        # End time is the start of the next line, or start + 4 seconds if last line
-        end_time = parsed_lines[i+1][0] if i+1 < len(parsed_lines) else start_time + 4
-
-        def format_time(seconds):
-            msec = int((seconds % 1) * 1000)
-            td_sec = int(seconds % 60)
-            td_min = int((seconds // 60) % 60)
-            td_hr = int(seconds // 3600)
-            return f"{td_hr:02}:{td_min:02}:{td_sec:02},{msec:03}"
-
-        srt_output.append(f"{index}")
-        srt_output.append(f"{format_time(start_time)} --> {format_time(end_time)}")
-        srt_output.append(parsed_lines[i][1])
-        srt_output.append("")
-        index += 1
-
-    return "\n".join(srt_output)
+    entries, _ = parse_lrc(lrc_text)
+    return _srt(entries) if entries else ""
 
-def embed_lyrics(file_path, lyrics_text):
+def normalize_lrc(lrc_text):
+    """Sorted LRC with one stamp per line and the offset applied (see parse_lrc)."""
+    return convert_lyrics(lrc_text)[0]
+
+LYRICS_KEY = '----:com.apple.iTunes:LYRICS'
+
+class _NeedsRewrite(Exception):
+    """Raised from the padding callback when the tags no longer fit in place."""
+
+def _in_place_padding(info):
+    # info.padding: free bytes left after the new tags (negative = the data after them has to move)
+    if info.padding < 0:
+        raise _NeedsRewrite()
+    return info.padding
+
+def _fresh_padding(info):
+    # info.size: bytes after the tags (a little with moov at the end, the whole mdat with moov in front)
+    if info.padding < 0:
+        if info.size > config.TAG_INPLACE_MAX:
+            raise _NeedsRewrite()
+        return config.TAG_PADDING
+    return info.padding
+
+def _grow_padding(info):
+    return config.TAG_PADDING
+
+def _moov_end(f):
+    """Offset right after the top-level moov atom (None if there is none)."""
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    offset = 0
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        size, name = struct.unpack('>I4s', f.read(8))
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+        elif size == 0:
+            size = file_size - offset
+        if size < 8:
+            return None
+        offset += size
+        if name == b'moov':
+            return offset
+    return None
+
+def _plain(values):
+    return [bytes(v) if isinstance(v, bytes) else v for v in values]
+
+class _Limited:
+    """Read-only view of the first `limit` bytes of a file (for shutil.copyfileobj)."""
+    def __init__(self, f, limit):
+        self.f = f
+        self.left = limit
+
+    def read(self, n=-1):
+        if n < 0 or n > self.left:
+            n = self.left
+        data = self.f.read(n)
+        self.left -= len(data)
+        return data
+
+class TagUpdate:
     """
-    Embeds lyrics into M4A (AAC) files using iTunes-style metadata.
+    Batched tag edits for one M4A file, written with a single save.
+    - Values equal to what the file already has are skipped (a no-op update never writes).
+    - If the new tags fit in the free space after ilst, they are written in place
+      (nothing else in the file moves).
+    - Otherwise the file is rebuilt in a single pass through a temp file + atomic
+      rename, with TAG_PADDING bytes reserved so the next edits fit in place again.
+    No data is ever shifted in place, so a crash can't leave a corrupt track behind.
+    The one exception is fresh=True: a file yt-dlp has just produced, still in flight
+    in the job journal (a crash gets it discarded or downloaded again). Its tags may
+    grow in place when at most TAG_INPLACE_MAX follows them, which with moov at the
+    end of the file is only the rest of moov.
     """
-    try:
-        if not os.path.exists(file_path):
-            return False
+    def __init__(self, file_path, fresh=False):
+        self.file_path = file_path
+        self.fresh = fresh
+        self._set = {}
+        self._delete = set()
 
-        audio = MP4(file_path)
-
-        # M4A uses specific atom names for lyrics
+    def set_lyrics(self, text, freeform=False):
         # '©lyr' is the standard Unsynchronized Lyrics tag
-        audio['\xa9lyr'] = lyrics_text
-
+        self._set['\xa9lyr'] = [text]
         # Some players look for a custom 'LYRICS' atom
-        # We add it as a freeform atom just in case
-        audio['----:com.apple.iTunes:LYRICS'] = lyrics_text.encode('utf-8')
+        if freeform:
+            self._set[LYRICS_KEY] = [text.encode('utf-8')]
+        return self
 
-        audio.save()
+    def set_ytid(self, ytid):
+        self._set[config.YTID_KEY] = [ytid.encode('utf-8')]
+        return self
+
+    def set_cover(self, cover_data):
+        self._set['covr'] = [MP4Cover(cover_data, imageformat=MP4Cover.FORMAT_JPEG)]
+        self._delete.discard('covr')
+        return self
+
+    def remove_cover(self):
+        self._set.pop('covr', None)
+        self._delete.add('covr')
+        return self
+
+    def pending(self):
+        return bool(self._set or self._delete)
+
+    def commit(self):
+        """Applies every pending change. Returns True if the file holds them afterwards."""
+        if not self.pending():
+            return True
+
+        audio = MP4(self.file_path)
+        if audio.tags is None:
+            audio.add_tags()
+
+        changed = False
+        for key, value in self._set.items():
+            if _plain(audio.tags.get(key, [])) != _plain(value):
+                audio.tags[key] = value
+                changed = True
+        for key in self._delete:
+            if key in audio.tags:
+                del audio.tags[key]
+                changed = True
+
+        self._set, self._delete = {}, set()
+        if not changed:
+            return True
+
+        try:
+            audio.save(padding=_fresh_padding if self.fresh else _in_place_padding)
+        except _NeedsRewrite:
+            self._rewrite(audio)
         return True
+
+    def _rewrite(self, audio):
+        """
+        Builds a new file in one pass and swaps it in atomically.
+        Only the head (everything up to the end of moov) is copied and re-tagged
+        (mutagen shifts the chunk offsets for the media data that follows), then the
+        rest of the file is appended unchanged. The media data is written once.
+        """
+        tmp_path = f"{self.file_path}.tags.tmp"
+        try:
+            with open(self.file_path, 'rb') as src:
+                head_size = _moov_end(src)
+                if head_size is None:
+                    raise ValueError("no moov atom")
+                src.seek(0)
+                with open(tmp_path, 'wb') as dst:
+                    shutil.copyfileobj(_Limited(src, head_size), dst)
+                shutil.copymode(self.file_path, tmp_path)
+
+                audio.save(tmp_path, padding=_grow_padding)
+
+                with open(tmp_path, 'ab') as dst:
+                    src.seek(head_size)
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+            os.replace(tmp_path, self.file_path)
+        except Exception:
+            try: os.remove(tmp_path)
+            except OSError: pass
+            raise
+
+def embed_lyrics(file_path, lyrics_text):
+    """
+    Embeds lyrics into M4A (AAC) files using iTunes-style metadata.
+    """
+    try:
+        if not os.path.exists(file_path):
+            return False
+        return TagUpdate(file_path).set_lyrics(lyrics_text, freeform=True).commit()
     except Exception as e:
         logger.log(2, f"   - [FileProcessor] Embedding error: {e}")
         return False
 
-def embed_metadata(file_path, lyrics=None, ytid=None, cover_data=None):
-    """Generic M4A metadata embedder."""
+def embed_metadata(file_path, lyrics=None, ytid=None, cover_data=None, fresh=False):
+    """Generic M4A metadata embedder (fresh: see TagUpdate)."""
     try:
         # Prevent trying to embed in MP4 videos (Mutagen MP4 is for audio containers)
         # We check the file extension directly now
         if file_path.endswith(".mp4"):
             return False
 
-        audio = MP4(file_path)
+        tags = TagUpdate(file_path, fresh=fresh)
         if lyrics:
-            audio['\xa9lyr'] = lyrics
+            tags.set_lyrics(lyrics)
         if ytid:
-            audio[config.YTID_KEY] = ytid.encode('utf-8')
+            tags.set_ytid(ytid)
 
         # Embed the image
         if cover_data:
-            audio['covr'] = [MP4Cover(cover_data, imageformat=MP4Cover.FORMAT_JPEG)]
+            tags.set_cover(cover_data)
 
-        audio.save()
-        return True
+        return tags.commit()
     except Exception as e:
         logger.log(2, f"   - [FileProcessor] Metadata error: {e}")
         return False
 
+# Lightweight view of an M4A/MP4 file's tags (see read_tags)
+TagSnapshot = namedtuple(
+    'TagSnapshot',
+    ['ytid', 'artist', 'title', 'album', 'duration', 'has_lyr', 'has_covr', 'lyrics'],
+    defaults=(None,)
+)
+
+# iTunes atom names we care about (ilst children)
+_TEXT_ATOMS = {b'\xa9ART': 'artist', b'\xa9nam': 'title', b'\xa9alb': 'album'}
+_YTID_MEAN, _YTID_NAME = config.YTID_KEY.split(':')[1:]
+
+def _iter_atoms(f, start, end):
+    """Yields (name, payload_start, atom_end) for each atom between start and end."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, name = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos # Atom runs to the end of its parent
+        if size < header_size:
+            return
+        yield name, pos + header_size, pos + size
+        pos += size
+
+def _find_atom(f, start, end, name):
+    for atom_name, atom_start, atom_end in _iter_atoms(f, start, end):
+        if atom_name == name:
+            return atom_start, atom_end
+    return None
+
+def _read_data_atom(f, start, end):
+    """Returns the payload of the first 'data' child of an ilst item (without type/locale)."""
+    for name, data_start, data_end in _iter_atoms(f, start, end):
+        if name == b'data':
+            f.seek(data_start + 8)
+            return f.read(data_end - data_start - 8)
+    return None
+
+def _read_freeform(f, start, end):
+    """Returns (mean, name, payload) of a '----' atom."""
+    mean = name = payload = None
+    for child, child_start, child_end in _iter_atoms(f, start, end):
+        if child in (b'mean', b'name'):
+            f.seek(child_start + 4) # Skip version/flags
+            value = f.read(child_end - child_start - 4).decode('utf-8', 'replace')
+            if child == b'mean': mean = value
+            else: name = value
+        elif child == b'data' and payload is None:
+            f.seek(child_start + 8)
+            payload = f.read(child_end - child_start - 8)
+    return mean, name, payload
+
+def read_tags(file_path, with_lyrics=False):
+    """
+    Single-pass tag reader for M4A/MP4 files.
+    Walks moov/mvhd and moov/udta/meta/ilst with seeks only (the media data and
+    sample tables are never loaded) and returns a TagSnapshot, or None if the
+    file can't be parsed. Set with_lyrics to also return the ©lyr text.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            f.seek(0, 2)
+            moov = _find_atom(f, 0, f.tell(), b'moov')
+            if not moov:
+                return None
+
+            values = {'ytid': None, 'artist': None, 'title': None, 'album': None,
+                      'duration': 0.0, 'has_lyr': False, 'has_covr': False, 'lyrics': None}
+
+            for name, start, end in _iter_atoms(f, *moov):
+                if name == b'mvhd':
+                    f.seek(start)
+                    header = f.read(32)
+                    if header[0] == 1: # 64-bit version
+                        timescale, duration = struct.unpack('>IQ', header[20:32])
+                    else:
+                        timescale, duration = struct.unpack('>II', header[12:20])
+                    if timescale:
+                        values['duration'] = duration / timescale
+
+                elif name == b'udta':
+                    meta = _find_atom(f, start, end, b'meta')
+                    if not meta:
+                        continue
+
+                    # 'meta' is a full box (4 bytes version/flags) in MP4, but not in QuickTime
+                    meta_start, meta_end = meta
+                    f.seek(meta_start + 4)
+                    if f.read(4) not in (b'hdlr', b'ilst', b'free', b'keys'):
+                        meta_start += 4
+
+                    ilst = _find_atom(f, meta_start, meta_end, b'ilst')
+                    if not ilst:
+                        continue
+
+                    for item, item_start, item_end in _iter_atoms(f, *ilst):
+                        if item in _TEXT_ATOMS:
+                            data = _read_data_atom(f, item_start, item_end)
+                            if data is not None:
+                                values[_TEXT_ATOMS[item]] = data.decode('utf-8', 'replace')
+                        elif item == b'\xa9lyr':
+                            values['has_lyr'] = True
+                            if with_lyrics:
+                                data = _read_data_atom(f, item_start, item_end)
+                                if data is not None:
+                                    values['lyrics'] = data.decode('utf-8', 'replace')
+                        elif item == b'covr':
+                            values['has_covr'] = True
+                        elif item == b'----':
+                            mean, key, data = _read_freeform(f, item_start, item_end)
+                            if mean == _YTID_MEAN and key == _YTID_NAME and data:
+                                values['ytid'] = data.decode('utf-8', 'replace')
+
+            return TagSnapshot(**values)
+    except Exception:
+        return None
+
 def extract_ytid(file_path):
     """Reads the hidden YouTube ID from an M4A file."""
-    try:
-        audio = MP4(file_path)
-        if config.YTID_KEY in audio:
-            return audio[config.YTID_KEY][0].decode('utf-8')
-    except:
-        pass
-    return None
+    snapshot = read_tags(file_path)
+    return snapshot.ytid if snapshot else None
 
 def has_cover(file_path):
     """Checks if an M4A file already has embedded cover art."""
-    try:
-        audio = MP4(file_path)
-        return 'covr' in audio
-    except:
-        return False
+    snapshot = read_tags(file_path)
+    return bool(snapshot and snapshot.has_covr)
 
 def remove_embedded_cover(file_path):
     """Aggressively removes all cover art atoms from an M4A file."""
     try:
-        audio = MP4(file_path)
         # M4A covers are stored in the 'covr' key
-        if 'covr' in audio:
-            # We set it to an empty list and then delete the key
-            audio['covr'] = []
-            del audio['covr']
-            audio.save()
-            return True
+        if has_cover(file_path):
+            return TagUpdate(file_path).remove_cover().commit()
     except Exception as e:
         print(f"   - [FileProcessor] Failed to remove cover: {e}")
     return False
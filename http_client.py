@@ -0,0 +1,157 @@
+import threading
+from collections import Counter
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.util.retry import Retry
+import config
+import logger
+import rate_limiter
+
+# Optional dependency: HTTP/2 needs 'httpx[http2]'
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+def _retry_policy(retries=None):
+    """Retries connection errors and 500/502/504 on idempotent requests (429/503 are left to the rate limiter)."""
+    retries = config.HTTP_RETRIES if retries is None else retries
+    kwargs = dict(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        status_forcelist=(500, 502, 504),
+        allowed_methods=IDEMPOTENT_METHODS,
+        backoff_factor=config.HTTP_BACKOFF,
+        raise_on_status=False,
+    )
+    try:
+        return Retry(backoff_jitter=config.HTTP_BACKOFF_JITTER, **kwargs)
+    except TypeError:
+        # urllib3 < 2 has no jitter
+        return Retry(**kwargs)
+
+class Http2Adapter(BaseAdapter):
+    """Transport adapter that sends requests through an HTTP/2 capable httpx client."""
+    def __init__(self, limiter):
+        super().__init__()
+        self.limiter = limiter
+        self.client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=config.HTTP_POOL_HOSTS * config.HTTP_POOL_SIZE,
+                                max_keepalive_connections=config.HTTP_POOL_SIZE))
+        self.versions = Counter()
+        self._lock = threading.Lock()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        # A bounded call (raced lyrics provider) only has its own timeout left: no retries
+        retries = 0 if self.limiter.bounded() is not None else config.HTTP_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                r = self.client.request(request.method, request.url, headers=dict(request.headers),
+                                        content=request.body, timeout=httpx.Timeout(read, connect=connect))
+                break
+            except httpx.TimeoutException as e:
+                if attempt == retries or request.method not in IDEMPOTENT_METHODS:
+                    raise requests.exceptions.Timeout(e, request=request)
+            except httpx.HTTPError as e:
+                if attempt == retries or request.method not in IDEMPOTENT_METHODS:
+                    raise requests.exceptions.ConnectionError(e, request=request)
+
+        with self._lock:
+            self.versions[r.http_version] += 1
+
+        response = requests.Response()
+        response.status_code = r.status_code
+        response.headers = CaseInsensitiveDict(r.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = r.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response._content = r.content
+        return response
+
+    def close(self):
+        self.client.close()
+
+class HttpSession(rate_limiter.LimitedSession):
+    """
+    Shared session for the lyrics and cover engines:
+    - pooled keep-alive connections (HTTP_POOL_SIZE per host),
+    - jittered retries on idempotent requests (see _retry_policy), none for bounded calls,
+    - a (connect, read) timeout on every call that doesn't pass its own,
+    - 429/503 retried once the rate limiter lets the host through again.
+    """
+    def __init__(self):
+        super().__init__()
+        self.headers.update({'User-Agent': config.USER_AGENT})
+
+        adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_HOSTS, pool_maxsize=config.HTTP_POOL_SIZE,
+                              max_retries=_retry_policy())
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        # Bounded calls (raced lyrics providers) must not retry a read that already used up their timeout
+        self._single_try = HTTPAdapter(pool_connections=config.HTTP_POOL_HOSTS, pool_maxsize=config.HTTP_POOL_SIZE,
+                                       max_retries=_retry_policy(0))
+
+        self.http2 = None
+        if config.HTTP2_ENABLED:
+            if httpx is None:
+                logger.log(3, "[HTTP] HTTP2_ENABLED needs 'httpx[http2]'; using HTTP/1.1.")
+            else:
+                try:
+                    self.http2 = Http2Adapter(self.limiter)
+                    self.mount("https://", self.http2)
+                except ImportError as e:  # httpx without the h2 extra
+                    logger.log(3, f"[HTTP] HTTP/2 unavailable ({e}); using HTTP/1.1.")
+
+    def get_adapter(self, url):
+        adapter = super().get_adapter(url)
+        if adapter is not self.http2 and self.limiter.bounded() is not None:
+            return self._single_try
+        return adapter
+
+    def request(self, method, url, *args, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = (config.HTTP_CONNECT_TIMEOUT, config.HTTP_READ_TIMEOUT)
+
+        # A bounded call (raced lyrics provider) gives up instead of waiting out Retry-After
+        retry = method.upper() in IDEMPOTENT_METHODS and self.limiter.bounded() is None
+        for attempt in range(config.HTTP_RETRIES + 1):
+            response = super().request(method, url, *args, **kwargs)
+            if response.status_code not in (429, 503) or not retry or attempt == config.HTTP_RETRIES:
+                return response
+            # The limiter is now holding the host back for Retry-After; the next call waits for it
+
+    def report(self):
+        """Logs how well keep-alive connections were reused, per host."""
+        adapter = self.get_adapter("http://")
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None or not pool.num_requests:
+                continue
+            reused = 100 * (1 - pool.num_connections / pool.num_requests)
+            logger.log(4, f"[HTTP] {pool.host}: {pool.num_requests} requests over "
+                          f"{pool.num_connections} connections ({reused:.0f}% reused)")
+        if self.http2:
+            versions = ", ".join(f"{v}: {n}" for v, n in self.http2.versions.items())
+            logger.log(4, f"[HTTP] HTTPS requests by protocol: {versions or 'none'}")
+
+# Global Instance (Shared by every engine and worker thread)
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = HttpSession()
+        return _session
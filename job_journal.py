@@ -0,0 +1,156 @@
+import glob
+import json
+import os
+import re
+import threading
+import time
+import config
+import logger
+import json_state
+
+# Unfinished files yt-dlp leaves next to "<base>.<ext>" while it works:
+# <base>.mp4.part, <base>.f137.mp4.part-Frag3, <base>.f140.m4a.ytdl, <base>.temp.m4a (ffmpeg)
+# Finished files (<base>.webm before ExtractAudio, <base>.f137.mp4 before merging) could
+# just as well be another track's, so only the ones the journal recorded are removed.
+ARTIFACT_RE = re.compile(r'^\.(f\d[\w-]*\.)?(temp\.)?\w+(\.part(-Frag\d+)?|\.ytdl)?$')
+
+def artifacts(final_file, keep=(), resumable=False):
+    """
+    Leftovers of an interrupted download of final_file, except the paths in keep.
+    resumable=True only returns ffmpeg temp files; .part/.ytdl files are left
+    for yt-dlp to continue from.
+    """
+    base = os.path.splitext(final_file)[0]
+    found = []
+    for path in glob.glob(glob.escape(base) + ".*"):
+        if path in keep:
+            continue
+        match = ARTIFACT_RE.match(path[len(base):])
+        if not match:
+            continue
+        temp, part = match.group(2), match.group(3)
+        if not (temp if resumable else temp or part):
+            continue  # Finished media, .lrc, .srt, .jpg, ...
+        found.append(path)
+    return found
+
+class JobJournal:
+    """
+    In-flight tracks (DOWNLOAD_DIR/.cache/jobs.json).
+    A track is recorded when its download starts and removed once it is tagged
+    and in the Registry. After a crash the next run knows which tracks were cut
+    off, which files on disk belong to them and whether only tagging was left.
+    Stages: 'downloading' -> 'downloaded'.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(config.DOWNLOAD_DIR, config.CACHE_SUBDIR, config.JOB_JOURNAL_FILE)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.jobs = json_state.load(self.path, {}, "JobJournal")
+
+    def _save(self):
+        """Caller holds the lock."""
+        json_state.save(self.path, self.jobs, durable=True)
+
+    def begin(self, job):
+        """The download stage picked the track up."""
+        entry = {k: job.entry[k] for k in ('id', 'title', 'url', 'webpage_url') if job.entry.get(k)}
+        with self._lock:
+            previous = self.jobs.get(job.ytid, {})
+            self.jobs[job.ytid] = {
+                "query": job.original_query,
+                "output_path": job.output_path,
+                "override_mode": job.override_mode,
+                "entry": entry,
+                "artist": job.artist,
+                "title": job.title,
+                "duration": job.duration,
+                "album": job.album,
+                "yt_thumb": job.yt_thumb,
+                "stage": "downloading",
+                "files": [list(f) for f in job.files],
+                "inflight": {},
+                "intermediates": previous.get("intermediates", []),
+                "attempts": previous.get("attempts", 0),
+                "started_at": time.time(),
+            }
+            self._save()
+
+    def start_format(self, ytid, ext, final_file):
+        with self._lock:
+            record = self.jobs.get(ytid)
+            if record:
+                record["inflight"][ext] = final_file
+                self._save()
+
+    def finish_format(self, ytid, ext, final_file):
+        with self._lock:
+            record = self.jobs.get(ytid)
+            if record:
+                record["inflight"].pop(ext, None)
+                record["files"].append([ext, final_file])
+                self._save()
+
+    def intermediate(self, ytid, path):
+        """yt-dlp finished a file the track's outputs are made from (a format before merging, the source of ExtractAudio)."""
+        with self._lock:
+            record = self.jobs.get(ytid)
+            if record and path not in record.setdefault("intermediates", []):
+                record["intermediates"].append(path)
+                self._save()
+
+    def downloaded(self, ytid):
+        """Every format is on disk; only lyrics, cover and tags are left."""
+        with self._lock:
+            record = self.jobs.get(ytid)
+            if record:
+                record["stage"] = "downloaded"
+                self._save()
+
+    def attempt(self, ytid):
+        """Counts a recovery attempt. Returns the new count."""
+        with self._lock:
+            record = self.jobs.get(ytid)
+            if not record:
+                return 0
+            record["attempts"] = record.get("attempts", 0) + 1
+            self._save()
+            return record["attempts"]
+
+    def finish(self, ytid):
+        with self._lock:
+            if self.jobs.pop(ytid, None) is not None:
+                self._save()
+
+    def pending(self):
+        """[(ytid, record), ...] left over from earlier runs."""
+        with self._lock:
+            return [(ytid, json.loads(json.dumps(record))) for ytid, record in self.jobs.items()]
+
+def _remove(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+            logger.log(5, f"   - [Recovery] Removed {os.path.basename(path)}")
+        except OSError:
+            pass
+
+def discard(record):
+    """Deletes every partial file of an interrupted track (finished formats are kept)."""
+    done = {f[1] for f in record.get("files", [])}
+    for final_file in record.get("inflight", {}).values():
+        if final_file not in done:
+            _remove([final_file])
+        _remove(artifacts(final_file, keep=done))
+    _remove([path for path in record.get("intermediates", []) if path not in done and os.path.exists(path)])
+
+def prepare_resume(record):
+    """
+    Removes what can't be resumed: the half-written output of the format that was
+    in flight and ffmpeg temp files. yt-dlp continues from the rest.
+    """
+    done = {f[1] for f in record.get("files", [])}
+    for final_file in record.get("inflight", {}).values():
+        if final_file not in done:
+            _remove([final_file])
+        _remove(artifacts(final_file, keep=done, resumable=True))
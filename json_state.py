@@ -0,0 +1,30 @@
+import json
+import os
+import logger
+
+def load(path, default, label):
+    """
+    Reads a JSON state file. A missing file gives `default`, an unreadable one
+    (torn write, bad JSON) is logged under `label` and gives `default` too.
+    """
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.log(3, f"[{label}] Unreadable {os.path.basename(path)}, starting fresh: {e}")
+        return default
+
+def save(path, data, durable=False, **dump_args):
+    """
+    Atomic rewrite: a reader sees the old file or the new one, never half of it.
+    durable: fsync before the rename, for state that must survive a power loss.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **dump_args)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
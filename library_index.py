@@ -0,0 +1,233 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+import config
+import logger
+import file_processor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+def _read_chunk(paths):
+    """Process pool worker: parses a batch of files."""
+    return [file_processor.read_tags(path) for path in paths]
+
+class LibraryIndex:
+    """
+    Persistent index of the library (DOWNLOAD_DIR/.cache/library.sqlite).
+    Each media file is stored with its size, mtime_ns and tag snapshot, so a
+    scan only re-reads files whose fingerprint changed and drops deleted ones.
+    A warm start costs one stat() per file.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(config.DOWNLOAD_DIR, config.CACHE_SUBDIR, config.LIBRARY_INDEX_FILE)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                readable INTEGER,
+                ytid TEXT,
+                artist TEXT,
+                title TEXT,
+                album TEXT,
+                duration REAL,
+                has_lyr INTEGER,
+                has_covr INTEGER
+            )
+        """)
+        self._conn.commit()
+
+    def _extensions(self):
+        return tuple(f".{ext}" for ext in (config.AUDIO_FORMAT, config.VIDEO_FORMAT))
+
+    def _row(self, path, size, mtime_ns, snapshot):
+        if snapshot is None:
+            return (path, size, mtime_ns, 0, None, None, None, None, 0.0, 0, 0)
+        return (path, size, mtime_ns, 1, snapshot.ytid, snapshot.artist, snapshot.title,
+                snapshot.album, snapshot.duration, int(snapshot.has_lyr), int(snapshot.has_covr))
+
+    def _upsert(self, rows):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, readable, ytid, artist, title, album, "
+            "duration, has_lyr, has_covr) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _list_dir(self, dirpath, exts, skip_dirs):
+        """One directory level: returns ([(path, size, mtime_ns), ...], [subdirs])."""
+        files, subdirs = [], []
+        try:
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            # Don't descend into our own cache/log folders
+                            if entry.name not in skip_dirs:
+                                subdirs.append(entry.path)
+                        elif entry.name.endswith(exts):
+                            st = entry.stat()
+                            files.append((entry.path, st.st_size, st.st_mtime_ns))
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.log(3, f"   - [LibraryIndex] Cannot list {dirpath}: {e}")
+        return files, subdirs
+
+    def _walk(self, root):
+        """Yields (path, size, mtime_ns) for every media file, listing directories in parallel."""
+        exts = self._extensions()
+        skip_dirs = {config.CACHE_SUBDIR, config.LOG_SUBDIR}
+        with ThreadPoolExecutor(max_workers=max(1, config.SCAN_THREADS), thread_name_prefix="scan") as pool:
+            pending = {pool.submit(self._list_dir, root, exts, skip_dirs)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    for subdir in subdirs:
+                        pending.add(pool.submit(self._list_dir, subdir, exts, skip_dirs))
+                    yield from files
+
+    def scan(self, root=None, on_entry=None):
+        """
+        Brings the index in line with the disk.
+        Directories are listed on SCAN_THREADS threads and changed files are parsed
+        on SCAN_PROCESSES processes while the walk continues. on_entry(path, snapshot)
+        is called for every file as soon as its snapshot is known. Chunks lost to a
+        crashed worker (or a broken pool) are parsed in-process instead.
+        Returns counts: {'new', 'changed', 'unchanged', 'removed'}.
+        """
+        root = root or config.DOWNLOAD_DIR
+        stats = {"new": 0, "changed": 0, "unchanged": 0, "removed": 0}
+
+        with self._lock:
+            known = {row[0]: row[1:] for row in self._conn.execute(
+                "SELECT path, size, mtime_ns, readable, ytid, artist, title, album, duration, has_lyr, has_covr "
+                "FROM files")}
+
+        seen = set()
+        rows = []
+        batch = []
+        futures = []
+        parse_pool = None
+        pool_broken = False
+
+        def collect(done_batch, snapshots):
+            for (path, size, mtime_ns), snapshot in zip(done_batch, snapshots):
+                rows.append(self._row(path, size, mtime_ns, snapshot))
+                if on_entry:
+                    on_entry(path, snapshot)
+
+        def collect_future(future, chunk):
+            # A crashed or killed worker breaks the whole pool: parse what it held in-process
+            nonlocal pool_broken
+            try:
+                snapshots = future.result()
+            except BrokenProcessPool as e:
+                if not pool_broken:
+                    logger.log(2, f"   - [LibraryIndex] Parser processes died ({e}), parsing in-process.")
+                pool_broken = True
+                snapshots = _read_chunk([path for path, _, _ in chunk])
+            except Exception as e:
+                logger.log(3, f"   - [LibraryIndex] Parser chunk failed ({e}), parsing it in-process.")
+                snapshots = _read_chunk([path for path, _, _ in chunk])
+            collect(chunk, snapshots)
+
+        def flush_batch(final=False):
+            nonlocal parse_pool, pool_broken
+            if not batch:
+                return
+            chunk = list(batch)
+            batch.clear()
+            # A handful of changed files (warm start) isn't worth starting processes for
+            if config.SCAN_PROCESSES > 0 and not pool_broken and (parse_pool or not final):
+                if parse_pool is None:
+                    # 'spawn': the scan threads are running, forking them is unsafe
+                    parse_pool = ProcessPoolExecutor(max_workers=config.SCAN_PROCESSES,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+                try:
+                    future = parse_pool.submit(_read_chunk, [path for path, _, _ in chunk])
+                except BrokenProcessPool:
+                    pool_broken = True
+                else:
+                    futures.append((future, chunk))
+                    return
+            collect(chunk, _read_chunk([path for path, _, _ in chunk]))
+
+        try:
+            for path, size, mtime_ns in self._walk(root):
+                seen.add(path)
+
+                row = known.get(path)
+                if row and (row[0], row[1]) == (size, mtime_ns):
+                    stats["unchanged"] += 1
+                    if on_entry:
+                        on_entry(path, self._snapshot(row[2:]))
+                    continue
+
+                stats["changed" if row else "new"] += 1
+                batch.append((path, size, mtime_ns))
+                if len(batch) >= config.SCAN_CHUNK_SIZE:
+                    flush_batch()
+
+                # Stream finished chunks while the walk goes on
+                while futures and futures[0][0].done():
+                    collect_future(*futures.pop(0))
+
+            flush_batch(final=True)
+            for future, chunk in futures:
+                collect_future(future, chunk)
+        finally:
+            if parse_pool:
+                parse_pool.shutdown()
+
+        deleted = [(path,) for path in known if path not in seen]
+        stats["removed"] = len(deleted)
+
+        with self._lock:
+            self._upsert(rows)
+            self._conn.executemany("DELETE FROM files WHERE path = ?", deleted)
+            self._conn.commit()
+
+        logger.log(5, f"   - [LibraryIndex] {stats['new']} new, {stats['changed']} changed, "
+                      f"{stats['unchanged']} unchanged, {stats['removed']} removed.")
+        return stats
+
+    def refresh(self, path):
+        """Re-reads a single file after we wrote to it (or created it)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                self._conn.commit()
+            return
+
+        row = self._row(path, st.st_size, st.st_mtime_ns, file_processor.read_tags(path))
+        with self._lock:
+            self._upsert([row])
+            self._conn.commit()
+
+    def _snapshot(self, row):
+        readable, ytid, artist, title, album, duration, has_lyr, has_covr = row
+        if not readable:
+            return None
+        return file_processor.TagSnapshot(ytid, artist, title, album, duration, bool(has_lyr), bool(has_covr))
+
+    def entries(self):
+        """Returns [(path, snapshot), ...] sorted by path."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, readable, ytid, artist, title, album, duration, has_lyr, has_covr "
+                "FROM files ORDER BY path").fetchall()
+        return [(row[0], self._snapshot(row[1:])) for row in rows]
+
+    def ids(self):
+        """YouTube IDs of every audio file in the library."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ytid FROM files WHERE ytid IS NOT NULL AND path LIKE ?",
+                (f"%.{config.AUDIO_FORMAT}",)).fetchall()
+        return {row[0] for row in rows}
@@ -0,0 +1,413 @@
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import config
+import logger
+import json_state
+import metadata_utils
+import file_processor
+import cover_engine
+
+def _digest(text):
+    return hashlib.sha1(text.replace('\r\n', '\n').strip().encode('utf-8')).hexdigest()
+
+def lyrics_digest(text):
+    """
+    Content hash of lyrics. Synced lyrics are hashed in their normalized form, so the
+    raw text embedded at download time and the normalized .lrc next to it match.
+    """
+    return _digest(file_processor.normalize_lrc(text))
+
+class RepairItem:
+    """One library file and what it is missing."""
+    def __init__(self, audio_path, snapshot, listing):
+        self.audio_path = audio_path
+        self.root, self.filename = os.path.split(audio_path)
+        base_name = os.path.splitext(self.filename)[0]
+        self.lrc_path = os.path.join(self.root, base_name + ".lrc")
+        self.srt_path = os.path.join(self.root, base_name + ".srt")
+        self.snapshot = snapshot
+        self.missing_lrc = base_name + ".lrc" not in listing
+        self.missing_srt = base_name + ".srt" not in listing
+
+        # (size, mtime_ns) of the file and its sidecars, as listed
+        self.fingerprints = [listing.get(self.filename), listing.get(base_name + ".lrc"),
+                             listing.get(base_name + ".srt")]
+        self._embedded = False  # Not read yet
+
+        # Set by the offline phase: what still needs an online lookup
+        self.want_lyrics = False
+        self.want_cover = False
+        self.tries = 0
+
+class LibraryRepair:
+    """
+    Library repair in two phases.
+    1. Offline: every file of the index is classified using its tag snapshot and one
+       listing per folder. It is either complete, fixable from local data (the .lrc or
+       the embedded lyrics exist, only a sidecar or the tag is missing) or in need of
+       an online lookup. Local fixes are written right away.
+    2. Online: the lookups run on REPAIR_WORKERS threads, paced per host by the shared
+       rate limiter. Files that were never tried come first.
+    Files where nothing was found are parked in DOWNLOAD_DIR/.cache/repair.json until
+    REPAIR_RETRY_AFTER has passed (or the file changes), so later runs don't search
+    for them again and an interrupted run continues with what is left.
+
+    Lyrics are repaired by diff: the .lrc (or the embedded lyrics) is the source, and the
+    .srt and the embedded tag are only written when they are missing or their content
+    hash differs from it. Files whose sidecars and tags were verified are remembered with
+    their fingerprints, so an unchanged library is checked without reading or writing anything.
+    """
+    def __init__(self, engine, index, path=None):
+        self.engine = engine
+        self.index = index
+        self.path = path or os.path.join(config.DOWNLOAD_DIR, config.CACHE_SUBDIR, config.REPAIR_STATE_FILE)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.c_engine = cover_engine.CoverEngine() if config.REPAIR_COVERS else None
+
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._dirty = False
+        state = json_state.load(self.path, {}, "Repair")
+        self.parked = state.get("parked", {})  # path -> lookups that found nothing and when to retry
+        self.synced = state.get("synced", {})  # path -> fingerprints when lyrics, .srt and tag last matched
+        self.counts = Counter()
+
+    # --- State ---
+
+    def _save(self):
+        """Skipped when nothing changed. Caller holds the lock."""
+        self._unsaved = 0
+        if not self._dirty:
+            return
+        json_state.save(self.path, {"parked": self.parked, "synced": self.synced})
+        self._dirty = False
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _fingerprint(self, path):
+        try:
+            st = os.stat(path)
+            return [st.st_size, st.st_mtime_ns]
+        except OSError:
+            return None
+
+    def _parked(self, item, now):
+        """
+        Applies the saved state to an item of the online queue.
+        Lookups that found nothing stay parked until their retry time; a changed file starts over.
+        """
+        record = self.parked.get(item.audio_path)
+        if record is None:
+            return
+        if record.get("fingerprint") != item.fingerprints[0]:
+            del self.parked[item.audio_path]
+            self._dirty = True
+            return
+        item.tries = record.get("tries", 0)
+        if item.want_lyrics and record.get("lyrics_retry_at", 0) > now:
+            item.want_lyrics = False
+        if item.want_cover and record.get("cover_retry_at", 0) > now:
+            item.want_cover = False
+
+    def _record(self, item, lyrics_missing, cover_missing):
+        """Parks what the lookup couldn't find (or forgets the file once it is complete)."""
+        retry_at = time.time() + config.REPAIR_RETRY_AFTER
+        with self._lock:
+            record = self.parked.get(item.audio_path, {})
+            if item.want_lyrics:
+                record["lyrics_retry_at"] = retry_at if lyrics_missing else 0
+            if item.want_cover:
+                record["cover_retry_at"] = retry_at if cover_missing else 0
+
+            if record.get("lyrics_retry_at") or record.get("cover_retry_at"):
+                record["tries"] = item.tries + 1
+                record["fingerprint"] = self._fingerprint(item.audio_path)
+                self.parked[item.audio_path] = record
+            else:
+                self.parked.pop(item.audio_path, None)
+
+            self._dirty = True
+            self._unsaved += 1
+            if self._unsaved >= config.REPAIR_SAVE_EVERY:
+                self._save()
+
+    # --- Phase 1: Offline ---
+
+    def _listing(self, root, listings):
+        """{name: [size, mtime_ns]} of a folder, listed once per classification."""
+        names = listings.get(root)
+        if names is None:
+            names = {}
+            try:
+                with os.scandir(root) as it:
+                    for entry in it:
+                        try:
+                            st = entry.stat()
+                            names[entry.name] = [st.st_size, st.st_mtime_ns]
+                        except OSError:
+                            continue
+            except OSError:
+                pass
+            listings[root] = names
+        return names
+
+    def _mark_synced(self, item):
+        """Remembers that the lyrics, .srt and tag of the item match (fingerprints taken after our writes)."""
+        fingerprints = [self._fingerprint(path) for path in (item.audio_path, item.lrc_path, item.srt_path)]
+        with self._lock:
+            if self.synced.get(item.audio_path) != fingerprints:
+                self.synced[item.audio_path] = fingerprints
+                self._dirty = True
+
+    def classify(self):
+        """Returns the online queue, sorted by priority. Local fixes are applied on the way."""
+        # Determine which extensions to scan
+        # If "both", we scan both. If "video", we scan mp4.
+        target_exts = tuple(f".{ext}" for ext in config.get_extensions())
+        listings = {}
+        queue = []
+        seen = set()
+        now = time.time()
+
+        # The index is kept up to date by build_id_index() and the Downloader
+        for audio_path, snapshot in self.index.entries():
+            if not audio_path.endswith(target_exts):
+                continue
+            seen.add(audio_path)
+            self.counts["files"] += 1
+
+            root, filename = os.path.split(audio_path)
+            item = RepairItem(audio_path, snapshot, self._listing(root, listings))
+
+            if snapshot is None:
+                if config.REPAIR_LYRICS and (item.missing_lrc or item.missing_srt):
+                    logger.log(2, f"   - Error reading M4A metadata: {filename}")
+                self.counts["unreadable"] += 1
+                continue
+
+            fixed = False
+            # Verified on an earlier run and none of the three files changed since: nothing to read
+            if config.REPAIR_LYRICS and self.synced.get(audio_path) != item.fingerprints:
+                lyrics_text, source = self._local_lyrics(item)
+                if lyrics_text:
+                    fixed = self._apply(item, lyrics_text, None, source)
+                elif item.missing_lrc:
+                    item.want_lyrics = True
+
+            # --- COVER REPAIR ---
+            if config.REPAIR_COVERS:
+                # OPTION A: WIPE ONLY (Use this to clean your library)
+                # logger.log(3, f"   - Wiping cover for: {filename}")
+                # file_processor.remove_embedded_cover(audio_path)
+                # continue # Skip to next song, do not repair yet
+
+                # OPTION B: REPAIR (Use this after you have wiped and fixed the code)
+                # (the lyrics fix above never touches covr, so the snapshot is still accurate)
+                item.want_cover = not snapshot.has_covr
+
+            if fixed:
+                self.counts["local"] += 1
+            if item.want_lyrics or item.want_cover:
+                self._parked(item, now)
+                if item.want_lyrics or item.want_cover:
+                    queue.append(item)
+                else:
+                    self.counts["parked"] += 1
+            elif not fixed:
+                self.counts["complete"] += 1
+
+        # Forget deleted files
+        with self._lock:
+            for state in (self.parked, self.synced):
+                for path in [p for p in state if p not in seen]:
+                    del state[path]
+                    self._dirty = True
+
+        # Never-tried files first, then folder by folder (covers are shared per album folder)
+        queue.sort(key=lambda item: (item.tries, item.audio_path))
+        return queue
+
+    def _local_lyrics(self, item):
+        """Returns (lyrics, source) from the .lrc file or the embedded tags, or (None, None)."""
+        # 1. Try to read from existing .lrc file
+        if not item.missing_lrc:
+            try:
+                with open(item.lrc_path, "r", encoding="utf-8") as f:
+                    lyrics_text = f.read()
+                if lyrics_text:
+                    return lyrics_text, "Local .lrc file"
+            except: pass
+
+        # 2. If no .lrc, try to read from Embedded M4A Tags
+        lyrics_text = self._embedded_lyrics(item)
+        if lyrics_text:
+            return lyrics_text, "Embedded M4A Tags"
+        return None, None
+
+    def _embedded_lyrics(self, item):
+        """\xa9lyr is the iTunes atom for lyrics (the text is only read when the index says it's there)."""
+        if item._embedded is False:
+            item._embedded = None
+            if item.snapshot.has_lyr:
+                snapshot = file_processor.read_tags(item.audio_path, with_lyrics=True)
+                item._embedded = snapshot.lyrics if snapshot else None
+        return item._embedded
+
+    def _stale(self, path, missing, content):
+        """True if the sidecar at path is missing or holds something else than content."""
+        if missing:
+            return True
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return _digest(f.read()) != _digest(content)
+        except (OSError, UnicodeDecodeError):
+            return True
+
+    def _apply(self, item, lyrics_text, cover_data, source=None):
+        """
+        Writes only what is missing or stale: sidecars, then one tag save.
+        Returns True if anything was written.
+        """
+        changes = []
+        # Lyrics and cover fixes for this file are written with one save at the end
+        tags = file_processor.TagUpdate(item.audio_path)
+        was_synced = self.synced.get(item.audio_path) == item.fingerprints
+
+        if lyrics_text:
+            # One parse for both sidecars
+            lrc_content, srt_content = file_processor.convert_lyrics(lyrics_text)
+
+            # Write LRC if missing (an existing .lrc is the source, never overwritten)
+            if item.missing_lrc:
+                with open(item.lrc_path, "w", encoding="utf-8") as f:
+                    f.write(lrc_content)
+                changes.append("   - Generated missing .lrc file")
+
+            # Write SRT if missing or out of date
+            if srt_content and self._stale(item.srt_path, item.missing_srt, srt_content):
+                with open(item.srt_path, "w", encoding="utf-8") as f:
+                    f.write(srt_content)
+                changes.append(f"   - {'Generated missing' if item.missing_srt else 'Updated stale'} .srt file")
+
+            # Re-embed only if the tag is missing or holds different lyrics
+            embedded = self._embedded_lyrics(item)
+            if not embedded or lyrics_digest(embedded) != lyrics_digest(lyrics_text):
+                tags.set_lyrics(lyrics_text, freeform=True)
+                changes.append(f"   - {'Updated' if embedded else 'Embedded'} lyrics tag")
+
+        if cover_data:
+            tags.set_cover(cover_data)
+
+        if changes and source:
+            logger.log(4, f"\n[Library Check]: {item.filename}")
+            logger.log(4, f"   - Found lyrics via: {source}")
+        for change in changes:
+            logger.log(4, change)
+
+        written = bool(changes)
+        if tags.pending():
+            try:
+                tags.commit()
+                written = True
+            except Exception as e:
+                logger.log(2, f"   - [FileProcessor] Tag update error: {e}")
+            self.index.refresh(item.audio_path)
+
+        # A cover write doesn't touch the lyrics: files that were in sync stay in sync
+        if lyrics_text or (was_synced and written):
+            self._mark_synced(item)
+        return written
+
+    # --- Phase 2: Online ---
+
+    def _search_lyrics(self, item):
+        artist = item.snapshot.artist or 'Unknown'
+        title = item.snapshot.title or 'Unknown'
+        duration = int(item.snapshot.duration)
+
+        # Fallback to filename if tags are generic
+        if artist == "Unknown" or title == "Unknown":
+            artist, title = metadata_utils.parse_filename_robustly(item.filename)
+
+        logger.log(5, f"   - Lyrics missing locally. Searching online for {artist} - {title}...")
+        lyrics_text, provider = self.engine.lookup(artist, title, duration)
+        if lyrics_text:
+            logger.log(4, f"   - Found lyrics via: Online Search ({provider})")
+        else:
+            logger.log(3, f"   - Still no lyrics found. for {title}-{artist}")
+        return lyrics_text
+
+    def _search_cover(self, item):
+        # 1. Try tags
+        artist = item.snapshot.artist or 'Unknown'
+        title = item.snapshot.title or 'Unknown'
+        album = item.snapshot.album or 'Unknown'
+
+        # 1. Filename Parsing Fallback
+        if artist.lower() == "unknown" or len(artist) < 2:
+            artist, title = metadata_utils.parse_filename_robustly(item.filename)
+
+        # 2. Final Clean
+        artist = metadata_utils.clean_metadata(artist)
+        title = metadata_utils.clean_metadata(title)
+
+        logger.log(5, f"   - Searching cover for: {artist} - {title}")
+
+        # Pass 'None' for yt_thumb_url because we are offline repairing
+        cover_data = self.c_engine.get_cover(artist, title, album, item.root, None)
+        if cover_data and len(cover_data) > 500 and item.audio_path.endswith(".m4a"):
+            logger.log(4, f"   - Success: Fixed cover for {title}")
+            return cover_data
+        logger.log(3, f"   - Failed: No cover found for '{artist} - {title}'")
+        return None
+
+    def _repair_online(self, item):
+        """Worker: looks up what the item is missing and writes it. Returns 'fixed', 'missing' or 'error'."""
+        logger.log(5, f"[Library Repair]: {item.filename}")
+        lyrics_text = cover_data = None
+        try:
+            if item.want_lyrics:
+                lyrics_text = self._search_lyrics(item)
+            if item.want_cover:
+                cover_data = self._search_cover(item)
+            self._apply(item, lyrics_text, cover_data)
+        except Exception as e:
+            logger.log(2, f"   - Error processing {item.filename}: {e}")
+            return "error"
+
+        lyrics_missing = item.want_lyrics and not lyrics_text
+        cover_missing = item.want_cover and not cover_data
+        self._record(item, lyrics_missing, cover_missing)
+        return "missing" if lyrics_missing or cover_missing else "fixed"
+
+    def run(self):
+        # 1. Offline
+        start = time.monotonic()
+        queue = self.classify()
+        logger.log(4, f"[Repair] {self.counts['files']} files in {time.monotonic() - start:.1f}s: "
+                      f"{self.counts['complete']} complete, {self.counts['local']} fixed locally, "
+                      f"{len(queue)} need an online lookup, {self.counts['parked']} waiting for a retry.")
+
+        # 2. Online (REPAIR_MAX_ONLINE limits one run; the rest stays queued for the next)
+        batch = queue[:config.REPAIR_MAX_ONLINE] if config.REPAIR_MAX_ONLINE > 0 else queue
+        results = Counter()
+        pool = ThreadPoolExecutor(max_workers=max(1, config.REPAIR_WORKERS), thread_name_prefix="repair")
+        try:
+            for result in pool.map(self._repair_online, batch):
+                results[result] += 1
+        finally:
+            # Interrupted (Ctrl+C / SIGTERM): drop what hasn't started, keep what was found
+            pool.shutdown(cancel_futures=True)
+            self.save()
+            left = len(queue) - sum(results.values())
+            if queue:
+                logger.log(4, f"[Repair] Online: {results['fixed']} fixed, {results['missing']} still incomplete "
+                              f"(retried in {config.REPAIR_RETRY_AFTER // 86400} days), {results['error']} errors, "
+                              f"{left} left for the next run.")
+        return results
@@ -2,12 +2,15 @@ import sys
 import os
 import datetime
 import glob
+import threading
 import config
 
 class DualWriter:
     def __init__(self, filename):
         self.terminal = sys.stdout
         self.filename = filename
+        # Worker threads log concurrently; keep each line intact
+        self._lock = threading.RLock()
         if config.LOG_LEVEL > 0:
             with open(self.filename, "w", encoding="utf-8") as f:
                 f.write(f"--- Log Started: {datetime.datetime.now()} (Level {config.LOG_LEVEL}) ---\n")
@@ -21,7 +24,10 @@ class DualWriter:
         if level is not None and level > config.LOG_LEVEL:
             should_log = False
 
-        if should_log:
+        if not should_log:
+            return
+
+        with self._lock:
             # Write to terminal (only if it's not a raw newline)
             if msg_str != "\n":
                 self.terminal.write(msg_str + ("\n" if level is not None else ""))
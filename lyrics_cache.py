@@ -0,0 +1,109 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import config
+import logger
+
+class LyricsCache:
+    """
+    SQLite cache in front of LyricsEngine.search.
+    - Hits are stored with the provider that found them.
+    - Misses are stored too, and retried once LYRICS_CACHE_NEGATIVE_TTL has passed.
+    - Old and least-recently-used entries are evicted on startup.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(config.DOWNLOAD_DIR, config.CACHE_SUBDIR, config.LYRICS_CACHE_FILE)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS lyrics (
+                key TEXT PRIMARY KEY,
+                lyrics TEXT,
+                source TEXT,
+                created_at REAL,
+                accessed_at REAL
+            )
+        """)
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.evict()
+
+    @staticmethod
+    def make_key(artist, title, duration):
+        """Normalized 'artist|title|bucket' key (case, accents and punctuation ignored)."""
+        def normalize(text):
+            text = unicodedata.normalize('NFKD', text or "")
+            text = "".join(c for c in text if not unicodedata.combining(c))
+            return re.sub(r'\W+', ' ', text.lower()).strip()
+
+        bucket = int(duration or 0) // config.LYRICS_CACHE_DURATION_BUCKET
+        return f"{normalize(artist)}|{normalize(title)}|{bucket}"
+
+    def get(self, artist, title, duration):
+        """
+        Returns (lyrics, source) for a cached hit, (None, source) for a cached miss
+        that is still within its TTL, or None if the providers must be asked.
+        """
+        key = self.make_key(artist, title, duration)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lyrics, source, created_at FROM lyrics WHERE key = ?", (key,)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            lyrics, source, created_at = row
+            if lyrics is None and now - created_at > config.LYRICS_CACHE_NEGATIVE_TTL:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE lyrics SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return lyrics, source
+
+    def put(self, artist, title, duration, lyrics, source=None):
+        """Stores a hit (lyrics + provider) or a miss (lyrics=None)."""
+        key = self.make_key(artist, title, duration)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO lyrics (key, lyrics, source, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)", (key, lyrics or None, source, now, now))
+            self._conn.commit()
+
+    def evict(self):
+        """Drops entries older than the max age, then LRU entries until under the size limit."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM lyrics WHERE created_at < ?", (now - config.LYRICS_CACHE_MAX_AGE,))
+            removed = cur.rowcount
+
+            total = self._conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(lyrics)), 0) FROM lyrics").fetchone()[0]
+            if total > config.LYRICS_CACHE_MAX_BYTES:
+                rows = self._conn.execute(
+                    "SELECT key, COALESCE(LENGTH(lyrics), 0) FROM lyrics ORDER BY accessed_at").fetchall()
+                doomed = []
+                for key, size in rows:
+                    if total <= config.LYRICS_CACHE_MAX_BYTES:
+                        break
+                    doomed.append((key,))
+                    total -= size
+                self._conn.executemany("DELETE FROM lyrics WHERE key = ?", doomed)
+                removed += len(doomed)
+
+            self._conn.commit()
+
+        if removed > 0:
+            logger.log(5, f"   - [LyricsCache] Evicted {removed} entries.")
@@ -1,20 +1,256 @@
-import requests
+import asyncio
 import re
+import threading
+import time
+from contextlib import nullcontext
 import base64
 import xml.etree.ElementTree as ET
 import config
 import logger
+import http_client
+import lyrics_cache
+import provider_stats
+import rate_limiter
+from concurrent.futures import ThreadPoolExecutor
 
 class LyricsEngine:
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({'User-Agent': config.USER_AGENT})
+        # Shared pooled session: host limits, retries and (connect, read) timeouts on every call
+        self.session = http_client.get_session()
+
+        # Provider requests are blocking; the async race runs them on these threads
+        self._executor = ThreadPoolExecutor(max_workers=config.LYRICS_PROVIDER_THREADS, thread_name_prefix="lyrics")
+
+        # Persistent (artist, title, duration) -> lyrics cache, misses included
+        self.cache = lyrics_cache.LyricsCache() if config.LYRICS_CACHE_ENABLED else None
+
+        # Per-provider health: skips dead providers and moves unreliable ones to the back
+        self.stats = provider_stats.ProviderStats()
 
     def search(self, artist, title, duration):
         """
         Orchestrates the search across 6 strategies.
         Handles deduplication and cleaning.
         """
+        return self.lookup(artist, title, duration)[0]
+
+    def lookup(self, artist, title, duration):
+        """
+        Like search(), but returns (lyrics, source).
+        Cached answers have a source starting with 'Cache'.
+        """
+        if config.LYRICS_RACE:
+            return asyncio.run(self.lookup_async(artist, title, duration))
+
+        artist, title = self._prepare(artist, title)
+        cached = self._from_cache(artist, title, duration)
+        if cached:
+            return cached
+
+        logger.log(4, f"   - [Lyrics] Searching for: '{artist} - {title}' ({duration}s)")
+
+        strategies = self._strategies(artist, title, duration)
+        ordered = self.stats.order(strategies)
+        found = (None, None)
+        # A miss is only cached if every provider was asked and said "not found"
+        definite = len(ordered) == len(strategies)
+        for name, func, args in ordered:
+            logger.log(5, f"     > Checking {name}...")
+            result, answered = self._call(name, func, args) # Failures count as errors, then we move on
+            if result:
+                found = (result, name)
+                break
+            definite = definite and answered
+
+        if found[0] or definite:
+            self._to_cache(artist, title, duration, *found)
+        return found
+
+    async def lookup_async(self, artist, title, duration):
+        """
+        Races the strategies, each started once the one above it missed or had
+        LYRICS_HEDGE_DELAY to answer.
+        Returns the highest-ranked provider that answers, so the result matches
+        the serial search as long as every provider answers within its deadline.
+        """
+        artist, title = self._prepare(artist, title)
+        cached = self._from_cache(artist, title, duration)
+        if cached:
+            return cached
+
+        logger.log(4, f"   - [Lyrics] Searching for: '{artist} - {title}' ({duration}s)")
+
+        strategies = self._strategies(artist, title, duration)
+        ordered = self.stats.order(strategies)
+        lyrics, name, definite = await self._race(ordered)
+        # A miss is only cached if every provider was asked and said "not found"
+        # (not after errors, timeouts, the deadline or a provider skipped by its breaker)
+        if lyrics or (definite and len(ordered) == len(strategies)):
+            self._to_cache(artist, title, duration, lyrics, name)
+        return lyrics, name
+
+    async def _race(self, strategies):
+        """
+        Returns (lyrics, provider name, definite) of the best answer, or (None, None, definite).
+        definite: every provider finished with a real "not found" (no error, timeout or cancellation).
+        """
+        loop = asyncio.get_running_loop()
+        names = [name for name, _, _ in strategies]
+        tasks = []
+        above = None
+        for name, func, args in strategies:
+            started = asyncio.Event()
+            tasks.append(asyncio.ensure_future(self._run_provider(loop, name, func, args, above, started)))
+            above = (tasks[-1], started)
+
+        deadline = loop.time() + config.LYRICS_SEARCH_DEADLINE
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    logger.log(5, "     > Search deadline reached.")
+                    break
+
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+
+                # Walk in priority order: a result only wins once every higher-ranked provider gave up
+                for name, task in zip(names, tasks):
+                    if not task.done():
+                        break
+                    if not task.cancelled() and task.result()[0]:
+                        return task.result()[0], name, True
+
+                # A result is in: lower-ranked providers can no longer win
+                best = self._best_index(tasks)
+                if best is not None:
+                    for task in tasks[best + 1:]:
+                        task.cancel()
+                    pending -= set(tasks[best + 1:])
+
+            # Deadline hit: settle for the best answer we have
+            best = self._best_index(tasks)
+            if best is not None:
+                return tasks[best].result()[0], names[best], True
+            definite = all(task.done() and not task.cancelled() and task.result()[1] for task in tasks)
+            return None, None, definite
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _from_cache(self, artist, title, duration):
+        if not self.cache:
+            return None
+        cached = self.cache.get(artist, title, duration)
+        if cached is None:
+            return None
+
+        lyrics, source = cached
+        logger.log(5, f"   - [Lyrics] Cache {'hit' if lyrics else 'miss (negative)'}: '{artist} - {title}'")
+        return lyrics, f"Cache ({source or 'no lyrics'})"
+
+    def _to_cache(self, artist, title, duration, lyrics, source):
+        if self.cache:
+            self.cache.put(artist, title, duration, lyrics, source)
+
+    def _best_index(self, tasks):
+        """Index of the highest-ranked finished task that found lyrics."""
+        for i, task in enumerate(tasks):
+            if task.done() and not task.cancelled() and task.result()[0]:
+                return i
+        return None
+
+    async def _run_provider(self, loop, name, func, args, above=None, started=None):
+        """
+        Runs one blocking provider on the executor. Never raises.
+        above: (task, started event) of the provider ranked above it. This one starts
+        once that one missed or has been running for LYRICS_HEDGE_DELAY, so a quick
+        answer from the top never sends the others out.
+        Cancelling the task stops the blocking call before its next request or wait (see _call).
+        Returns (result, answered) like _call().
+        """
+        try:
+            if above:
+                above_task, above_started = above
+                await above_started.wait()
+                await asyncio.wait([above_task], timeout=config.LYRICS_HEDGE_DELAY)
+                if above_task.done() and not above_task.cancelled() and above_task.result()[0]:
+                    return None, False  # Lost already
+        finally:
+            if started:
+                started.set()
+
+        logger.log(5, f"     > Checking {name}...")
+        cancel = threading.Event()
+        try:
+            return await loop.run_in_executor(self._executor, self._call, name, func, args, cancel)
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+        except Exception as e:
+            logger.log(5, f"     > {name} failed: {e.__class__.__name__}")
+            return None, False
+
+    def _call(self, name, func, args, cancel=None):
+        """
+        Runs one provider and records its outcome and latency.
+        Returns (result, answered): answered is False when the provider failed,
+        so a None result is only a real "not found" if answered is True.
+        cancel: set by the race when it no longer needs the answer. The call then
+        has LYRICS_PROVIDER_TIMEOUT from now: its requests give up (rate_limiter.Abandoned)
+        rather than wait for the host's limits past that, or once cancel is set.
+        """
+        bound = nullcontext()
+        if cancel is not None:
+            if cancel.is_set():
+                return None, False  # Lost the race while queued
+            bound = self.session.limiter.bound(time.monotonic() + config.LYRICS_PROVIDER_TIMEOUT, cancel)
+
+        start = time.monotonic()
+        try:
+            with bound:
+                result = func(*args)
+        except rate_limiter.Abandoned:
+            if cancel.is_set():
+                logger.log(5, f"     > {name} cancelled")
+            else:
+                self.stats.record(name, "error", time.monotonic() - start)
+                logger.log(5, f"     > {name} timed out")
+            return None, False
+        except Exception as e:
+            self.stats.record(name, "error", time.monotonic() - start)
+            logger.log(5, f"     > {name} failed: {e.__class__.__name__}")
+            return None, False
+        self.stats.record(name, "hit" if result else "miss", time.monotonic() - start)
+        return result, True
+
+    def _get(self, url, **kwargs):
+        return self._request("GET", url, **kwargs)
+
+    def _post(self, url, **kwargs):
+        return self._request("POST", url, **kwargs)
+
+    def _request(self, method, url, **kwargs):
+        """
+        Provider request. A raced call is abandoned here once it was cancelled or
+        its deadline passed, and its timeouts never reach past that deadline.
+        """
+        bound = self.session.limiter.bounded()
+        if bound:
+            deadline, cancel = bound
+            remaining = deadline - time.monotonic()
+            if cancel.is_set() or remaining <= 0:
+                raise rate_limiter.Abandoned()
+            kwargs['timeout'] = (min(config.HTTP_CONNECT_TIMEOUT, remaining), min(config.HTTP_READ_TIMEOUT, remaining))
+        return self._checked(self.session.request(method, url, **kwargs))
+
+    def _checked(self, r):
+        """Throttling and server errors are failures, not "no lyrics" (4xx such as 404 still are)."""
+        if r.status_code == 429 or r.status_code >= 500:
+            r.raise_for_status()
+        return r
+
+    def _prepare(self, artist, title):
         # 1. Deduplicate: Prevent "Artist - Artist - Song"
         if artist.lower() in title.lower():
             title = re.sub(re.escape(artist), '', title, flags=re.IGNORECASE).strip(' -–—|')
@@ -23,10 +259,11 @@ class LyricsEngine:
         if artist.lower() == "unknown" and " - " in title:
             artist, title = title.split(" - ", 1)
 
-        logger.log(4, f"   - [Lyrics] Searching for: '{artist} - {title}' ({duration}s)")
+        return artist, title
 
-        # Strategy Chain
-        strategies = [
+    def _strategies(self, artist, title, duration):
+        """Strategy Chain (priority order)."""
+        return [
             ("LRCLIB", self._get_lrclib, [artist, title, duration]),
             ("NetEase", self._get_netease, [artist, title]),
             ("QQ Music", self._get_qq, [artist, title]),
@@ -35,43 +272,32 @@ class LyricsEngine:
             ("Lyrics.ovh", self._get_ovh, [artist, title])
         ]
 
-        for name, func, args in strategies:
-            try:
-                logger.log(5, f"     > Checking {name}...")
-                result = func(*args)
-                if result:
-                    return result
-            except Exception as e:
-                continue # Move to next strategy on failure
-
-        return None
-
     def _get_lrclib(self, artist, title, duration):
         params = {'artist_name': artist, 'track_name': title, 'duration': duration}
-        r = self.session.get(config.LRCLIB_URL, params=params, timeout=config.TIMEOUT)
+        r = self._get(config.LRCLIB_URL, params=params)
         if r.status_code == 200:
             return r.json().get('syncedLyrics') or r.json().get('plainLyrics')
         return None
 
     def _get_netease(self, artist, title):
         search_params = {'s': f"{artist} {title}", 'type': 1, 'limit': 1}
-        r = self.session.post(config.NETEASE_SEARCH_URL, data=search_params, timeout=config.TIMEOUT)
+        r = self._post(config.NETEASE_SEARCH_URL, data=search_params)
         data = r.json()
         if 'result' in data and data['result'].get('songs'):
             song_id = data['result']['songs'][0]['id']
-            lyric_r = self.session.get(f"{config.NETEASE_LYRIC_URL}?os=pc&id={song_id}&lv=-1&kv=-1&tv=-1")
+            lyric_r = self._get(f"{config.NETEASE_LYRIC_URL}?os=pc&id={song_id}&lv=-1&kv=-1&tv=-1")
             return lyric_r.json().get('lrc', {}).get('lyric')
         return None
 
     def _get_qq(self, artist, title):
         headers = {'Referer': 'https://y.qq.com/'}
         search_params = {'w': f"{artist} {title}", 'format': 'json', 'n': 1}
-        r = self.session.get(config.QQ_SEARCH_URL, params=search_params, headers=headers, timeout=config.TIMEOUT)
+        r = self._get(config.QQ_SEARCH_URL, params=search_params, headers=headers)
         data = r.json()
         if 'data' in data and data['data']['song']['list']:
             song_mid = data['data']['song']['list'][0]['songmid']
             lyric_params = {'songmid': song_mid, 'format': 'json', 'nobase64': 0}
-            lyric_r = self.session.get(config.QQ_LYRIC_URL, params=lyric_params, headers=headers)
+            lyric_r = self._get(config.QQ_LYRIC_URL, params=lyric_params, headers=headers)
             lyric_data = lyric_r.json()
             if 'lyric' in lyric_data:
                 return base64.b64decode(lyric_data['lyric']).decode('utf-8')
@@ -79,7 +305,7 @@ class LyricsEngine:
 
     def _get_megalyrics(self, artist, title):
         params = {'action': 'findLyric', 'artist': artist, 'title': title}
-        r = self.session.get(config.MEGALYRICS_URL, params=params, timeout=config.TIMEOUT)
+        r = self._get(config.MEGALYRICS_URL, params=params)
         root = ET.fromstring(r.content)
         for lyric in root.findall('lyric'):
             if lyric.get('type') == 'lrc' or lyric.text:
@@ -87,15 +313,15 @@ class LyricsEngine:
         return None
 
     def _get_gecimi(self, artist, title):
-        r = self.session.get(f"{config.GECIMI_URL}/{title}/{artist}", timeout=config.TIMEOUT)
+        r = self._get(f"{config.GECIMI_URL}/{title}/{artist}")
         data = r.json()
         if 'result' in data and data['result']:
             lrc_url = data['result'][0]['lrc']
-            return self.session.get(lrc_url).text
+            return self._get(lrc_url).text
         return None
 
     def _get_ovh(self, artist, title):
-        r = self.session.get(f"{config.OVH_URL}/{artist}/{title}", timeout=config.TIMEOUT)
+        r = self._get(f"{config.OVH_URL}/{artist}/{title}")
         if r.status_code == 200:
             return r.json().get('lyrics')
         return None
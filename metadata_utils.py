@@ -1,15 +1,35 @@
 import re
 import os
+from functools import lru_cache
 import config
 
+_INLINE_FLAGS = re.compile(r'\(\?i\)')
+_SPACES = re.compile(r'\s+')
+_TITLE_SPLIT = re.compile(r' [-–—|:] ')
+_FILENAME_SPLIT = re.compile(r' [-–—|] ')
+
+def compile_junk_patterns(keywords=None):
+    """
+    Compiles config.JUNK_KEYWORDS once, in order.
+    Every pattern is applied with IGNORECASE anyway, so inline '(?i)' flags are
+    dropped (Python 3.11+ rejects them anywhere but at the very start).
+    The patterns stay separate passes: removing one keyword can create a match
+    for a later one, and a single alternation would miss those.
+    """
+    keywords = config.JUNK_KEYWORDS if keywords is None else keywords
+    return [re.compile(_INLINE_FLAGS.sub('', pattern), re.IGNORECASE) for pattern in keywords]
+
+_JUNK_PATTERNS = compile_junk_patterns()
+
+@lru_cache(maxsize=4096)
 def clean_metadata(text):
-    """Removes junk keywords defined in config."""
+    """Removes junk keywords defined in config (memoized: titles repeat across lookups)."""
     if not text:
         return ""
-    for pattern in config.JUNK_KEYWORDS:
-        text = re.sub(pattern, '', text, flags=re.IGNORECASE)
+    for pattern in _JUNK_PATTERNS:
+        text = pattern.sub('', text)
     # Remove extra spaces and trailing dashes
-    text = re.sub(r'\s+', ' ', text).strip(' -–—|')
+    text = _SPACES.sub(' ', text).strip(' -–—|')
     return text
 
 def extract_professional_metadata(info):
@@ -24,7 +44,7 @@ def extract_professional_metadata(info):
     if not artist or not title:
         video_title = info.get('title', '')
         # Split by common delimiters
-        parts = re.split(r' [-–—|:] ', video_title, maxsplit=1)
+        parts = _TITLE_SPLIT.split(video_title, maxsplit=1)
         if len(parts) == 2:
             artist, title = parts[0], parts[1]
         else:
@@ -34,7 +54,7 @@ def extract_professional_metadata(info):
     # 3. Sanitization
     # If the artist is the uploader, and the title contains "artist - title", split it.
     if (" - " in title) and (artist.lower() in title.lower()):
-        parts = re.split(r' [-–—|:] ', title, maxsplit=1)
+        parts = _TITLE_SPLIT.split(title, maxsplit=1)
         if len(parts) == 2:
             artist, title = parts[0], parts[1]
 
@@ -45,7 +65,7 @@ def parse_filename_robustly(filename):
 
     # 1. Try to split by common delimiters
     # We use a regex that looks for a dash surrounded by spaces, which is the standard
-    parts = re.split(r' [-–—|] ', name)
+    parts = _FILENAME_SPLIT.split(name)
 
     if len(parts) >= 2:
         # If there are multiple parts, assume the first is Artist, the rest is Title
@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+import logger
+
+# Sentinel telling a worker thread to exit
+_STOP = object()
+
+class Stage:
+    """
+    A pool of worker threads fed by a bounded queue.
+    func(item) returns the item for the next stage, or None to drop it.
+    When the next stage's queue is full, workers block (backpressure).
+    """
+    def __init__(self, name, func, workers=1, queue_size=0):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.next_stage = None
+        self._threads = []
+        self._lock = threading.Lock()
+
+        # Throughput stats
+        self.processed = 0
+        self.dropped = 0
+        self.busy_seconds = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def put(self, item):
+        """Blocks while the queue is full."""
+        self.queue.put(item)
+
+    def stop(self):
+        """Lets queued items drain, then joins all workers."""
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+
+            start = time.monotonic()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                logger.log(2, f"   - [Pipeline] {self.name} error: {e}")
+                result = None
+            end = time.monotonic()
+
+            with self._lock:
+                if self.first_start is None:
+                    self.first_start = start
+                self.last_end = end
+                self.busy_seconds += end - start
+                if result is None:
+                    self.dropped += 1
+                else:
+                    self.processed += 1
+
+            if result is not None and self.next_stage:
+                self.next_stage.put(result)
+
+    def stats(self):
+        with self._lock:
+            total = self.processed + self.dropped
+            wall = (self.last_end - self.first_start) if total else 0.0
+            return {
+                "stage": self.name,
+                "workers": self.workers,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "busy_seconds": round(self.busy_seconds, 2),
+                "avg_seconds": round(self.busy_seconds / total, 2) if total else 0.0,
+                "per_minute": round(total * 60 / wall, 2) if wall > 0 else 0.0,
+            }
+
+class Pipeline:
+    """Chains stages so each one works on a different track at the same time."""
+    def __init__(self, stages):
+        self.stages = stages
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.next_stage = downstream
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def submit(self, item):
+        self.stages[0].put(item)
+
+    def close(self):
+        """Drains every stage in order (upstream first) and stops the workers."""
+        for stage in self.stages:
+            stage.stop()
+
+    def report(self):
+        logger.log(4, "\n[Pipeline] Stage throughput:")
+        for stage in self.stages:
+            s = stage.stats()
+            logger.log(4, f"   - {s['stage']:<9} workers={s['workers']} done={s['processed']} "
+                          f"dropped={s['dropped']} avg={s['avg_seconds']}s rate={s['per_minute']}/min")
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from collections import Counter
+import config
+import logger
+import json_state
+import downloader
+
+# Used until a real run has been recorded
+DEFAULT_SECONDS_PER_TRACK = 15.0
+DEFAULT_REQUESTS_PER_TRACK = {
+    "youtube.com": 2,       # Search / playlist page + full metadata
+    "googlevideo.com": 1,   # One stream per format
+    "lrclib.net": 1,
+    "itunes.apple.com": 1,
+}
+
+class RunStats:
+    """
+    Throughput of past runs (DOWNLOAD_DIR/.cache/runs.json), kept for the planner.
+    Each run stores its wall time, downloaded tracks, requests per host and the
+    size of every playlist it expanded. The last RUN_STATS_KEEP runs are kept.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(config.DOWNLOAD_DIR, config.CACHE_SUBDIR, config.RUN_STATS_FILE)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.runs = json_state.load(self.path, [], "RunStats")
+
+    def record(self, wall, tracks, queries, requests, playlists):
+        """Adds one run. playlists: {query: {'entries': n, 'new': m}}."""
+        with self._lock:
+            self.runs.append({
+                "finished_at": time.time(),
+                "wall": round(wall, 1),
+                "workers": config.MAX_WORKERS,
+                "pipeline": config.PIPELINE_ENABLED,
+                "tracks": tracks,
+                "queries": queries,
+                "requests": dict(requests),
+                "playlists": playlists,
+            })
+            self.runs = self.runs[-config.RUN_STATS_KEEP:]
+            json_state.save(self.path, self.runs)
+
+    def seconds_per_track(self):
+        """Wall seconds per downloaded track over the recorded runs (None without history)."""
+        runs = [r for r in self.runs if r["tracks"]]
+        if not runs:
+            return None
+        return sum(r["wall"] for r in runs) / sum(r["tracks"] for r in runs)
+
+    def requests_per_track(self):
+        """{host: requests per downloaded track} over the recorded runs (None without history)."""
+        runs = [r for r in self.runs if r["tracks"]]
+        if not runs:
+            return None
+        totals = Counter()
+        for r in runs:
+            totals.update(r["requests"])
+        tracks = sum(r["tracks"] for r in runs)
+        return {host: count / tracks for host, count in totals.items()}
+
+    def playlist(self, query):
+        """Last recorded {'entries', 'new'} of a playlist, or None."""
+        for r in reversed(self.runs):
+            if query in r.get("playlists", {}):
+                return r["playlists"][query]
+        return None
+
+def plan(tasks, registry, existing_ids, stats=None, manifest=None):
+    """
+    Dry run of songs.txt: checks every task against the Registry, the library
+    index and the task manifest (no network, nothing downloaded) and estimates
+    the cost of the real run. Returns the plan as a dict and logs it.
+    """
+    stats = stats or RunStats()
+
+    # A real run first drops Registry entries whose file is gone (sync_with_disk);
+    # the dry run can't rewrite the Registry, so hits only count if the file is on disk
+    def registered(query):
+        return registry.lookup(query) in existing_ids
+
+    def known(ytid):
+        return ytid in existing_ids
+
+    present = 0
+    to_resolve = []
+    playlists = []
+    cached_new = 0  # Tracks left in lines the manifest already resolved (no listing needed)
+    for query, target_folder, mode in tasks:
+        # Same fast-skip rules as Downloader.process_query
+        is_playlist = downloader.is_playlist(query)
+        if not is_playlist:
+            if registered(query):
+                present += 1
+                continue
+            ytid = downloader.extract_id_from_url(query) if query.startswith('http') else None
+            if ytid and known(ytid):
+                present += 1
+                continue
+
+        cached = manifest.entries(query, target_folder, mode) if manifest else None
+        if cached is not None:
+            missing = sum(1 for entry in cached if not known(entry['id']))
+            cached_new += missing
+            if not missing:
+                present += 1
+        elif is_playlist:
+            playlists.append(query)
+        else:
+            to_resolve.append(query)
+
+    # Playlists can't be sized offline: use what the last expansion found
+    history = [stats.playlist(query) for query in playlists]
+    sizes = [p["entries"] for p in history if p]
+    average_size = sum(sizes) / len(sizes) if sizes else 0
+    playlist_new = 0.0
+    unknown_playlists = 0
+    for p in history:
+        if p:
+            playlist_new += p["new"]
+        else:
+            unknown_playlists += 1
+            playlist_new += average_size
+
+    new_tracks = len(to_resolve) + playlist_new + cached_new
+
+    # Requests per host: per-track rates already include the searches and playlist listings
+    per_track = stats.requests_per_track() or DEFAULT_REQUESTS_PER_TRACK
+    requests = {host: round(rate * new_tracks) for host, rate in per_track.items()}
+
+    # Wall time: measured throughput, but never faster than the slowest host's rate limit allows
+    seconds_per_track = stats.seconds_per_track()
+    measured = seconds_per_track is not None
+    throughput_time = new_tracks * (seconds_per_track if measured else DEFAULT_SECONDS_PER_TRACK)
+    bottleneck, limit_time = None, 0.0
+    for host, count in requests.items():
+        rate, _ = config.HOST_RATE_LIMITS.get(host, config.DEFAULT_HOST_RATE_LIMIT)
+        if count / rate > limit_time:
+            bottleneck, limit_time = host, count / rate
+
+    result = {
+        "tasks": len(tasks),
+        "present": present,
+        "to_resolve": len(to_resolve),
+        "playlists": len(playlists),
+        "unknown_playlists": unknown_playlists,
+        "cached_tracks": cached_new,
+        "new_tracks": round(new_tracks),
+        "requests": requests,
+        "wall_seconds": round(max(throughput_time, limit_time)),
+        "bottleneck": bottleneck if limit_time > max(throughput_time, 60) else None,
+        "measured": measured,
+    }
+    report(result)
+    return result
+
+def _duration(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}h {rest // 60:02}m" if hours else f"{rest // 60}m {rest % 60:02}s"
+
+def report(result):
+    logger.log(4, "\n" + "="*40)
+    logger.log(4, "RUN PLAN (nothing is downloaded)")
+    logger.log(4, "="*40)
+    logger.log(4, f"Tasks in {config.SONG_LIST}: {result['tasks']}")
+    logger.log(4, f"   - Already in the library: {result['present']}")
+    logger.log(4, f"   - Need resolution:        {result['to_resolve']}")
+    logger.log(4, f"   - Known entries left:     {result['cached_tracks']} (listed before, not downloaded yet)")
+    logger.log(4, f"   - Playlists to expand:    {result['playlists']}"
+                  + (f" ({result['unknown_playlists']} never expanded before)" if result['unknown_playlists'] else ""))
+    logger.log(4, f"Expected new tracks: ~{result['new_tracks']}")
+    if result["unknown_playlists"]:
+        logger.log(4, "   - Playlists never expanded before are counted at the average size of the known ones.")
+    logger.log(4, "Estimated requests per host:")
+    for host, count in sorted(result["requests"].items(), key=lambda item: -item[1]):
+        logger.log(4, f"   - {host}: ~{count}")
+
+    basis = "past runs" if result["measured"] else "defaults (no run recorded yet)"
+    logger.log(4, f"Projected wall time: {_duration(result['wall_seconds'])} "
+                  f"(MAX_WORKERS={config.MAX_WORKERS}, throughput from {basis})")
+    if result["bottleneck"]:
+        logger.log(4, f"   - Bound by the {result['bottleneck']} rate limit; more workers won't help.")
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+import config
+import logger
+import json_state
+
+class ProviderStats:
+    """
+    Health of each lyrics provider (DOWNLOAD_DIR/.cache/providers.json), kept across runs.
+    - Hit, miss and error counts, plus a window of recent outcomes and latencies.
+    - Circuit breaker: PROVIDER_BREAKER_ERRORS errors in a row open it and the
+      provider is skipped. Once the cooldown has passed, a single probe request
+      is let through: success closes the breaker, failure reopens it with a
+      doubled cooldown (up to PROVIDER_BREAKER_MAX_COOLDOWN).
+    - Providers that mostly fail or never find anything are moved behind the
+      healthy ones (see order()).
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(config.DOWNLOAD_DIR, config.CACHE_SUBDIR, config.PROVIDER_STATS_FILE)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._probing = {}  # name -> start time of the probe in flight
+        self._unsaved = 0
+        self.providers = json_state.load(self.path, {}, "ProviderStats")
+
+    def _entry(self, name):
+        """Caller holds the lock."""
+        entry = self.providers.get(name)
+        if entry is None:
+            entry = {"calls": 0, "hits": 0, "misses": 0, "errors": 0,
+                     "recent": "", "latencies": [],
+                     "consecutive_errors": 0, "opened_at": None, "cooldown": config.PROVIDER_BREAKER_COOLDOWN}
+            self.providers[name] = entry
+        return entry
+
+    # --- Recording ---
+
+    def record(self, name, outcome, latency):
+        """outcome: 'hit', 'miss' or 'error'. latency in seconds."""
+        now = time.time()
+        with self._lock:
+            entry = self._entry(name)
+            entry["calls"] += 1
+            entry[{"hit": "hits", "miss": "misses", "error": "errors"}[outcome]] += 1
+            entry["recent"] = (entry["recent"] + outcome[0])[-config.PROVIDER_WINDOW:]
+            entry["latencies"] = (entry["latencies"] + [round(latency, 3)])[-config.PROVIDER_WINDOW:]
+
+            was_probe = self._probing.pop(name, None) is not None
+
+            if outcome == "error":
+                entry["consecutive_errors"] += 1
+                if was_probe:
+                    entry["opened_at"] = now
+                    entry["cooldown"] = min(entry["cooldown"] * 2, config.PROVIDER_BREAKER_MAX_COOLDOWN)
+                    logger.log(3, f"   - [Lyrics] {name} still failing, next probe in {entry['cooldown'] // 60:.0f} min.")
+                elif entry["opened_at"] is None and entry["consecutive_errors"] >= config.PROVIDER_BREAKER_ERRORS:
+                    entry["opened_at"] = now
+                    entry["cooldown"] = config.PROVIDER_BREAKER_COOLDOWN
+                    logger.log(3, f"   - [Lyrics] {name} disabled after {entry['consecutive_errors']} errors in a row.")
+            else:
+                entry["consecutive_errors"] = 0
+                if entry["opened_at"] is not None:
+                    entry["opened_at"] = None
+                    entry["cooldown"] = config.PROVIDER_BREAKER_COOLDOWN
+                    logger.log(4, f"   - [Lyrics] {name} is answering again.")
+
+            self._unsaved += 1
+            if self._unsaved >= config.PROVIDER_SAVE_EVERY:
+                self._save()
+
+    # --- Decisions ---
+
+    def allow(self, name):
+        """False while the provider's breaker is open. After the cooldown one probe call is allowed."""
+        with self._lock:
+            entry = self._entry(name)
+            if entry["opened_at"] is None:
+                return True
+            now = time.time()
+            if now - entry["opened_at"] < entry["cooldown"]:
+                return False
+            # One probe at a time (a probe that was never run expires after the search deadline)
+            if now - self._probing.get(name, 0) < config.LYRICS_SEARCH_DEADLINE:
+                return False
+            self._probing[name] = now
+            logger.log(5, f"     > Probing {name}...")
+            return True
+
+    def _demoted(self, entry):
+        recent = entry["recent"]
+        if len(recent) < config.PROVIDER_MIN_SAMPLES:
+            return False
+        error_rate = recent.count("e") / len(recent)
+        hit_rate = recent.count("h") / len(recent)
+        return error_rate >= config.PROVIDER_DEMOTE_ERROR_RATE or hit_rate < config.PROVIDER_DEMOTE_HIT_RATE
+
+    def order(self, strategies):
+        """
+        Drops providers with an open breaker and moves unhealthy ones to the end.
+        The configured priority is kept within each group.
+        """
+        allowed = [s for s in strategies if self.allow(s[0])]
+        with self._lock:
+            demoted = {name for name, _, _ in allowed if self._demoted(self._entry(name))}
+        return [s for s in allowed if s[0] not in demoted] + [s for s in allowed if s[0] in demoted]
+
+    # --- Reporting ---
+
+    def summary(self):
+        """Per provider: counts, recent rates, latency percentiles (ms) and breaker state."""
+        def percentile(values, p):
+            if not values:
+                return None
+            values = sorted(values)
+            return round(values[min(len(values) - 1, int(p / 100 * len(values)))] * 1000)
+
+        with self._lock:
+            result = {}
+            for name, entry in self.providers.items():
+                recent = entry["recent"]
+                result[name] = {
+                    "calls": entry["calls"],
+                    "hits": entry["hits"],
+                    "misses": entry["misses"],
+                    "errors": entry["errors"],
+                    "hit_rate": round(recent.count("h") / len(recent), 3) if recent else None,
+                    "error_rate": round(recent.count("e") / len(recent), 3) if recent else None,
+                    "latency_ms": {p: percentile(entry["latencies"], int(p[1:])) for p in ("p50", "p90", "p99")},
+                    "state": "open" if entry["opened_at"] is not None else
+                             "demoted" if self._demoted(entry) else "ok",
+                }
+            return result
+
+    def dump(self, path=None):
+        """Writes summary() as JSON (for dashboards). Returns the path."""
+        path = path or os.path.join(os.path.dirname(self.path), config.PROVIDER_STATS_DUMP)
+        json_state.save(path, {"generated_at": time.time(), "providers": self.summary()}, indent=2)
+        return path
+
+    def report(self):
+        for name, s in self.summary().items():
+            logger.log(5, f"[Lyrics] {name}: {s['calls']} calls, hit rate {s['hit_rate']}, "
+                          f"error rate {s['error_rate']}, p50 {s['latency_ms']['p50']} ms, {s['state']}")
+
+    # --- Persistence ---
+
+    def _save(self):
+        """Caller holds the lock."""
+        json_state.save(self.path, self.providers)
+        self._unsaved = 0
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+if __name__ == "__main__":
+    # Print the current provider health without running anything
+    print(json.dumps(ProviderStats().summary(), indent=2))
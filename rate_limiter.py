@@ -0,0 +1,305 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import requests
+import config
+import logger
+
+# How yt-dlp words a throttled request in its errors and retry warnings
+_HTTP_429 = re.compile(r'\bHTTP Error 429\b')
+
+def status_of(error):
+    """
+    HTTP status behind an exception, or None: .status (yt-dlp HTTPError),
+    .response.status_code (requests), the wrapped error of a yt-dlp DownloadError,
+    or a 429 in yt-dlp's message.
+    """
+    exc_info = getattr(error, 'exc_info', None)
+    for e in (error, exc_info[1] if exc_info else None):
+        if e is None:
+            continue
+        status = getattr(e, 'status', None)
+        if status is None:
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+        if isinstance(status, int):
+            return status
+    return 429 if _HTTP_429.search(str(error)) else None
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class Abandoned(Exception):
+    """A wait inside HostLimiter.bound() was cancelled or would run past its deadline."""
+
+class _Bucket:
+    """Token bucket of one host plus its adaptive backoff state. Guarded by HostLimiter._lock."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.scale = 1.0          # Adaptive factor on rate: halved when throttled, recovers on success
+        self.blocked_until = 0.0  # Retry-After / backoff pause (monotonic)
+        self.backoff = 0.0
+        self.error_rate = 0.0     # Moving average of failed requests
+        self.throttled = 0
+        self.requests = 0         # Tokens handed out (requests sent)
+
+class _Outcome:
+    """Result of the request made inside a slot(), reported when the slot is left."""
+    def __init__(self):
+        self.status = None
+        self.retry_after = None
+        self.error = False
+
+class HostLimiter:
+    """
+    Per-host limits shared by the engines and the downloader:
+    - a token bucket (HOST_RATE_LIMITS: requests per second + burst),
+    - a cap on simultaneous requests (HOST_CONCURRENCY),
+    - adaptive backoff: a 429/503 pauses the host for Retry-After (or an
+      exponential delay) and halves its rate; a high error rate slows it down;
+      successful requests bring it back to full speed.
+    Hosts are matched by suffix, so 'rr3---sn-xyz.googlevideo.com' uses the 'googlevideo.com' limits.
+    """
+    def __init__(self, limits=None, default=None, rates=None, default_rate=None):
+        self.limits = limits if limits is not None else config.HOST_CONCURRENCY
+        self.default = default if default is not None else config.DEFAULT_HOST_CONCURRENCY
+        self.rates = rates if rates is not None else config.HOST_RATE_LIMITS
+        self.default_rate = default_rate if default_rate is not None else config.DEFAULT_HOST_RATE_LIMIT
+        self._semaphores = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()  # The slot() (for YdlLogger) and bound() the current thread is in
+
+    def _host_key(self, host_or_url):
+        """Maps a URL or hostname to its configured limit key."""
+        host = host_or_url
+        if "://" in host_or_url:
+            host = urlparse(host_or_url).hostname or ""
+        host = host.lower()
+
+        for key in list(self.limits) + list(self.rates):
+            if host == key or host.endswith("." + key):
+                return key
+        return host
+
+    def _semaphore(self, key):
+        with self._lock:
+            sem = self._semaphores.get(key)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.limits.get(key, self.default))
+                self._semaphores[key] = sem
+            return sem
+
+    def _bucket(self, key):
+        """Caller holds the lock."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, burst = self.rates.get(key, self.default_rate)
+            bucket = _Bucket(rate, burst)
+            self._buckets[key] = bucket
+        return bucket
+
+    @contextmanager
+    def bound(self, deadline, cancel=None):
+        """
+        Requests this thread makes inside the block raise Abandoned instead of
+        waiting for a token, a backoff pause or a connection slot past deadline
+        (time.monotonic()), or once cancel (threading.Event) is set.
+        """
+        previous = getattr(self._local, 'bound', None)
+        self._local.bound = (deadline, cancel)
+        try:
+            yield
+        finally:
+            self._local.bound = previous
+
+    def bounded(self):
+        """(deadline, cancel) of the bound() the current thread is in, or None."""
+        return getattr(self._local, 'bound', None)
+
+    def _pause(self, wait):
+        """Sleeps, unless the current bound() can't afford the wait (Abandoned)."""
+        bound = self.bounded()
+        if bound is None:
+            time.sleep(wait)
+            return
+        deadline, cancel = bound
+        if time.monotonic() + wait > deadline:
+            raise Abandoned()
+        if cancel is None:
+            time.sleep(wait)
+        elif cancel.wait(wait):
+            raise Abandoned()
+
+    def _enter(self, sem):
+        """Takes a connection slot, giving up like _pause() inside a bound()."""
+        bound = self.bounded()
+        if bound is None:
+            sem.acquire()
+            return
+        deadline, cancel = bound
+        while not sem.acquire(timeout=max(0.0, min(0.1, deadline - time.monotonic()))):
+            if time.monotonic() >= deadline or (cancel is not None and cancel.is_set()):
+                raise Abandoned()
+
+    def acquire(self, key):
+        """Blocks until the host's bucket has a token (and any backoff pause is over). See bound()."""
+        while True:
+            with self._lock:
+                bucket = self._bucket(key)
+                now = time.monotonic()
+                if now < bucket.blocked_until:
+                    wait = bucket.blocked_until - now
+                else:
+                    rate = bucket.rate * bucket.scale
+                    bucket.tokens = min(bucket.burst, bucket.tokens + (now - bucket.updated) * rate)
+                    bucket.updated = now
+                    if bucket.tokens >= 1:
+                        bucket.tokens -= 1
+                        bucket.requests += 1
+                        return
+                    wait = (1 - bucket.tokens) / rate
+            self._pause(wait)
+
+    def report(self, host_or_url, status=None, retry_after=None, error=False):
+        """
+        Feeds a request's outcome back into the host's limits.
+        status: HTTP status (429/503 = throttled), retry_after: header value,
+        error: the request failed without a usable response (timeout, reset, ...).
+        """
+        key = self._host_key(host_or_url)
+        throttled = status in (429, 503)
+        failed = error or throttled or (status is not None and status >= 500)
+
+        with self._lock:
+            bucket = self._bucket(key)
+            bucket.error_rate = bucket.error_rate * 0.8 + (0.2 if failed else 0.0)
+
+            if throttled:
+                delay = parse_retry_after(retry_after)
+                if delay is None:
+                    delay = bucket.backoff * 2 or config.RATE_BACKOFF_BASE
+                bucket.backoff = min(delay, config.RATE_BACKOFF_MAX)
+                bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + bucket.backoff)
+                bucket.scale = max(config.RATE_MIN_SCALE, bucket.scale / 2)
+                bucket.throttled += 1
+                logger.log(3, f"   - [RateLimit] {key} throttled, pausing {bucket.backoff:.1f}s "
+                              f"(rate now {bucket.rate * bucket.scale:.2f}/s)")
+            elif failed and bucket.error_rate > config.RATE_ERROR_THRESHOLD:
+                bucket.scale = max(config.RATE_MIN_SCALE, bucket.scale * 0.75)
+            elif not failed:
+                bucket.backoff = 0.0
+                bucket.scale = min(1.0, bucket.scale * 1.05)
+
+    @contextmanager
+    def slot(self, host_or_url):
+        """
+        Blocks until the host has a free connection slot and a token (see bound()).
+        Yields an outcome the body can fill in (status, retry_after, error); it is
+        reported when the body finishes, so a clean exit counts as a success.
+        Exceptions raised inside count as errors (an HTTP 429/503 as throttling, see status_of).
+        """
+        key = self._host_key(host_or_url)
+        sem = self._semaphore(key)
+        # Connection slot first: a request abandoned while waiting for it never spends a token
+        self._enter(sem)
+        try:
+            self.acquire(key)
+            outcome = _Outcome()
+            previous = getattr(self._local, 'outcome', None)
+            self._local.outcome = outcome
+            try:
+                yield outcome
+            except Exception as e:
+                self.report(key, status=status_of(e) or outcome.status, error=True)
+                raise
+            finally:
+                self._local.outcome = previous
+        finally:
+            sem.release()
+        self.report(key, outcome.status, outcome.retry_after, outcome.error)
+
+    def note(self, message, error=False):
+        """Marks the current thread's slot as failed / throttled ('HTTP Error 429'). No-op outside a slot."""
+        outcome = getattr(self._local, 'outcome', None)
+        if outcome is None:
+            return
+        if _HTTP_429.search(message):
+            outcome.status = 429
+        if error:
+            outcome.error = True
+
+    def log_summary(self):
+        """Logs the hosts that throttled us during the run."""
+        with self._lock:
+            hit = [(key, b) for key, b in self._buckets.items() if b.throttled]
+        for key, bucket in hit:
+            logger.log(4, f"[RateLimit] {key}: throttled {bucket.throttled}x, "
+                          f"ended at {bucket.rate * bucket.scale:.2f} req/s")
+
+    def request_counts(self):
+        """{host: requests sent} since start."""
+        with self._lock:
+            return {key: b.requests for key, b in self._buckets.items() if b.requests}
+
+# Global Instance (Shared by every engine and worker thread)
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_limiter():
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = HostLimiter()
+        return _limiter
+
+class LimitedSession(requests.Session):
+    """requests.Session that waits for the host's limits and reports every response back to them."""
+    def __init__(self, limiter=None):
+        super().__init__()
+        self.limiter = limiter or get_limiter()
+
+    def request(self, method, url, *args, **kwargs):
+        with self.limiter.slot(url) as outcome:
+            response = super().request(method, url, *args, **kwargs)
+            outcome.status = response.status_code
+            outcome.retry_after = response.headers.get("Retry-After")
+        return response
+
+class YdlLogger:
+    """
+    yt-dlp 'logger' option. With ignoreerrors, yt-dlp reports failures (a 429
+    included) instead of raising them, so its errors and warnings are noted on
+    the slot() the calling thread is in. Errors are still logged; the rest is
+    dropped (quiet / no_warnings).
+    """
+    def __init__(self, limiter=None):
+        self.limiter = limiter or get_limiter()
+
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        self.limiter.note(msg)
+
+    def error(self, msg):
+        self.limiter.note(msg, error=True)
+        logger.log(2, f"   - {msg}")
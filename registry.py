@@ -1,24 +1,124 @@
+import atexit
 import json
 import os
+import threading
+import time
 import config
 import logger
 
 class Registry:
+    """
+    Query -> YouTube ID registry.
+    Lookups are O(1) (set/dict). New entries are appended to a journal
+    (.registry.json.journal) instead of rewriting the whole file; the journal is
+    folded into .registry.json every REGISTRY_COMPACT_EVERY entries, through a
+    temp file + atomic rename so a crash can never leave a half-written registry.
+
+    Group commit: save() only buffers. Entries are flushed (and fsynced) every
+    REGISTRY_FLUSH_EVERY entries or REGISTRY_FLUSH_INTERVAL seconds, and on exit.
+    Buffered entries are visible to is_downloaded() immediately.
+    """
     def __init__(self):
         self.path = os.path.join(config.DOWNLOAD_DIR, config.REGISTRY_FILE)
+        self.journal_path = self.path + ".journal"
+        # Re-entrant: sync_with_disk() calls compact() while holding the lock
+        self._lock = threading.RLock()
+        self._pending = []       # Entries added since the last save()
+        self._journal_count = 0  # Entries in the journal since the last compaction
+        self._torn = False       # Journal ends with a half-written line (crash)
+        self._last_flush = time.monotonic()
         self.data = self._load()
 
+        # Appending after a torn line would corrupt the next entry too
+        if self._torn:
+            self.compact()
+
+        # Time-based flush for slow trickles, final flush on interpreter exit
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="registry-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
     def _load(self):
+        data = {"ids": set(), "queries": {}}
         if os.path.exists(self.path):
             try:
                 with open(self.path, 'r') as f:
-                    return json.load(f)
-            except: pass
-        return {"ids": [], "queries": {}}
+                    raw = json.load(f)
+                data["ids"] = set(raw.get("ids", []))
+                data["queries"] = dict(raw.get("queries", {}))
+            except Exception as e:
+                # Keep the damaged file for inspection instead of silently overwriting it
+                backup = f"{self.path}.corrupt-{int(time.time())}"
+                logger.log(2, f"   - Registry unreadable ({e}). Moved to {os.path.basename(backup)}")
+                try: os.replace(self.path, backup)
+                except OSError: pass
+
+        # Replay entries written since the last compaction
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        self._torn = True # Torn last line from a crash
+                        continue
+                    data["ids"].add(entry["id"])
+                    data["queries"][entry["q"]] = entry["id"]
+                    self._journal_count += 1
+        return data
 
     def save(self):
-        with open(self.path, 'w') as f:
-            json.dump(self.data, f)
+        """Group commit: flushes once enough entries or time have accumulated."""
+        with self._lock:
+            if (len(self._pending) >= config.REGISTRY_FLUSH_EVERY or
+                    time.monotonic() - self._last_flush >= config.REGISTRY_FLUSH_INTERVAL):
+                self.flush()
+
+    def flush(self):
+        """Appends buffered entries to the journal (fsynced); compacts once it has grown enough."""
+        with self._lock:
+            if self._pending:
+                with open(self.journal_path, 'a') as f:
+                    for query, ytid in self._pending:
+                        f.write(json.dumps({"q": query, "id": ytid}) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._journal_count += len(self._pending)
+                logger.log(5, f"   - Registry: Committed {len(self._pending)} entries.")
+                self._pending = []
+            self._last_flush = time.monotonic()
+
+            if self._journal_count >= config.REGISTRY_COMPACT_EVERY:
+                self.compact()
+
+    def _flush_loop(self):
+        while not self._stop.wait(config.REGISTRY_FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.log(2, f"   - Registry flush failed: {e}")
+
+    def close(self):
+        """Stops the flush thread and writes everything still buffered. Safe to call twice."""
+        self._stop.set()
+        self.flush()
+
+    def compact(self):
+        """Rewrites .registry.json atomically and empties the journal."""
+        with self._lock:
+            self._pending = [] # Everything in memory goes into the snapshot
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"ids": sorted(self.data["ids"]), "queries": self.data["queries"]}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+            # Safe to drop now: replaying it again would be a no-op anyway
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_count = 0
 
     def is_downloaded(self, query, ytid=None):
         """
@@ -26,48 +126,60 @@ class Registry:
         - If ytid is provided: Checks query OR ytid.
         - If only one arg provided: Checks if that arg exists as a key OR a value.
         """
-        # Check if the query itself is a known key (Search string or ID)
-        if query in self.data["queries"]:
-            return True
+        with self._lock:
+            # Check if the query itself is a known key (Search string or ID)
+            if query in self.data["queries"]:
+                return True
+
+            # Check if the ID exists in the master ID set
+            if ytid and ytid in self.data["ids"]:
+                return True
 
-        # Check if the ID exists in the master ID list
-        if ytid and ytid in self.data["ids"]:
-            return True
+            # Fallback: if 'query' is actually an ID passed as the first arg
+            if query in self.data["ids"]:
+                return True
 
-        # Fallback: if 'query' is actually an ID passed as the first arg
-        if query in self.data["ids"]:
-            return True
+            return False
 
-        return False
+    def lookup(self, query):
+        """The YouTube ID a query (or an ID) is registered under, or None."""
+        with self._lock:
+            if query in self.data["queries"]:
+                return self.data["queries"][query]
+            if query in self.data["ids"]:
+                return query
+            return None
 
     def add(self, query, ytid):
-        if ytid not in self.data["ids"]:
-            self.data["ids"].append(ytid)
-        self.data["queries"][query] = ytid
+        with self._lock:
+            self.data["ids"].add(ytid)
+            self.data["queries"][query] = ytid
+            self._pending.append((query, ytid))
 
     def sync_with_disk(self, existing_ids):
         """
         Removes IDs and Queries from the registry if they
         are no longer present on the hard drive.
         """
-        initial_count = len(self.data["ids"])
-
-        # 1. Filter IDs: Keep only those found in the RAM index
-        self.data["ids"] = [ytid for ytid in self.data["ids"] if ytid in existing_ids]
-
-        # 2. Filter Queries: Remove queries that point to missing IDs
-        # We create a new dictionary to avoid "RuntimeError: dictionary changed size during iteration"
-        new_queries = {}
-        for query, ytid in self.data["queries"].items():
-            # Remove any existing entries that are playlist URLs
-            if "list=" in query.lower():
-                continue
-            if ytid in existing_ids:
-                new_queries[query] = ytid
-
-        self.data["queries"] = new_queries
-
-        removed = initial_count - len(self.data["ids"])
-        if removed > 0:
-            logger.log(4, f"   - Registry Sync: Removed {removed} entries for missing files.")
-            self.save()
+        with self._lock:
+            initial_count = len(self.data["ids"])
+
+            # 1. Filter IDs: Keep only those found in the RAM index
+            self.data["ids"] = {ytid for ytid in self.data["ids"] if ytid in existing_ids}
+
+            # 2. Filter Queries: Remove queries that point to missing IDs
+            # We create a new dictionary to avoid "RuntimeError: dictionary changed size during iteration"
+            new_queries = {}
+            for query, ytid in self.data["queries"].items():
+                # Remove any existing entries that are playlist URLs
+                if "list=" in query.lower():
+                    continue
+                if ytid in existing_ids:
+                    new_queries[query] = ytid
+
+            self.data["queries"] = new_queries
+
+            removed = initial_count - len(self.data["ids"])
+            if removed > 0:
+                logger.log(4, f"   - Registry Sync: Removed {removed} entries for missing files.")
+                self.compact()
@@ -0,0 +1,77 @@
+import threading
+import yt_dlp
+import config
+import logger
+from concurrent.futures import ThreadPoolExecutor
+
+class BatchResolver:
+    """
+    Fetches full yt-dlp metadata for many playlist entries concurrently.
+    Every worker thread reuses a single YoutubeDL instance instead of
+    building a new one per track.
+    """
+    def __init__(self, base_opts, limiter, workers=None):
+        self.base_opts = base_opts
+        self.limiter = limiter
+        self.workers = workers or config.RESOLVE_WORKERS
+        self._local = threading.local()
+        self._instances = []
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="resolve")
+
+    def _ydl(self):
+        """This thread's extractor (YoutubeDL isn't safe to share between threads)."""
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL(self.base_opts)
+            self._local.ydl = ydl
+            with self._lock:
+                self._instances.append(ydl)
+        return ydl
+
+    def resolve_one(self, entry):
+        """Full metadata for one flat playlist entry (or search result)."""
+        ytid = entry.get('id')
+        video_url = entry.get('webpage_url') or entry.get('url') or f"https://www.youtube.com/watch?v={ytid}"
+
+        logger.log(5, f"   - [Network] Fetching metadata: {ytid}")
+        with self.limiter.slot("youtube.com"):
+            return self._ydl().extract_info(video_url, download=False)
+
+    def _resolve_job(self, job):
+        try:
+            job.video = self.resolve_one(job.entry)
+        except Exception as e:
+            logger.log(2, f"   - Track Error: {e}")
+            job.video = None
+        job.resolved = True
+        return job
+
+    def prefetch(self, jobs):
+        """
+        Yields jobs in order with job.video filled in, while the metadata of the
+        next ones is already being fetched (at most 2 x workers in flight).
+        """
+        window = self.workers * 2
+        futures = []
+        jobs = iter(jobs)
+
+        for job in jobs:
+            futures.append(self._pool.submit(self._resolve_job, job))
+            if len(futures) >= window:
+                break
+
+        while futures:
+            job = futures.pop(0).result()
+            next_job = next(jobs, None)
+            if next_job is not None:
+                futures.append(self._pool.submit(self._resolve_job, next_job))
+            yield job
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        with self._lock:
+            for ydl in self._instances:
+                try: ydl.close()
+                except Exception: pass
+            self._instances = []
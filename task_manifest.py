@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import config
+import logger
+import json_state
+
+# Fields of a flat entry the Downloader needs to start a track from it
+ENTRY_FIELDS = ('id', 'title', 'url', 'webpage_url')
+
+def task_hash(query, target_folder, override_mode):
+    """Identity of a songs.txt task: a line edited in any way (query, folder, mode) is a new task."""
+    return hashlib.sha1(json.dumps([query, target_folder, override_mode]).encode('utf-8')).hexdigest()
+
+class TaskManifest:
+    """
+    Parsed songs.txt tasks (DOWNLOAD_DIR/.cache/tasks.json).
+    Each task is stored under its hash with the time it was last resolved and the
+    entries it resolved to (ID, title, URL). An unchanged line reuses them instead
+    of asking YouTube again: searches and single videos until the line changes,
+    playlists until PLAYLIST_REFRESH_INTERVAL has passed.
+    New resolutions are written every TASK_MANIFEST_SAVE_EVERY tasks or
+    TASK_MANIFEST_SAVE_INTERVAL seconds; save() writes the rest at the end of the run.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(config.DOWNLOAD_DIR, config.CACHE_SUBDIR, config.TASK_MANIFEST_FILE)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+        self.tasks = json_state.load(self.path, {}, "TaskManifest")
+
+    def _save(self):
+        """Caller holds the lock."""
+        json_state.save(self.path, self.tasks)
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+
+    def save(self):
+        """Writes resolutions not saved yet."""
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def _fresh(self, record, now):
+        if not record.get("playlist"):
+            return True
+        return now - record["resolved_at"] < config.PLAYLIST_REFRESH_INTERVAL
+
+    def entries(self, query, target_folder, override_mode):
+        """The cached entries of a task, or None if it is new, changed or due for a refresh."""
+        with self._lock:
+            record = self.tasks.get(task_hash(query, target_folder, override_mode))
+            if record is None or not self._fresh(record, time.time()):
+                return None
+            return [dict(entry) for entry in record["entries"]]
+
+    def resolved(self, query, target_folder, override_mode, video_list, playlist=False):
+        """
+        Stores what a task resolved to (the flat entries of extract_info).
+        Entries without a title are left out, the Downloader skips them anyway.
+        """
+        entries = [{k: entry[k] for k in ENTRY_FIELDS if entry.get(k)}
+                   for entry in video_list if entry and entry.get('id') and entry.get('title')]
+        with self._lock:
+            self.tasks[task_hash(query, target_folder, override_mode)] = {
+                "query": query,
+                "playlist": playlist,
+                "resolved_at": time.time(),
+                "entries": entries,
+            }
+            self._unsaved += 1
+            if (self._unsaved >= config.TASK_MANIFEST_SAVE_EVERY or
+                    time.monotonic() - self._last_save >= config.TASK_MANIFEST_SAVE_INTERVAL):
+                self._save()
+
+    def sync(self, tasks):
+        """
+        Drops tasks no longer in songs.txt and logs what this run has to resolve.
+        Returns {'new', 'unchanged', 'refresh'} counts.
+        """
+        now = time.time()
+        counts = {"new": 0, "unchanged": 0, "refresh": 0}
+        with self._lock:
+            current = {task_hash(*task) for task in tasks}
+            removed = [key for key in self.tasks if key not in current]
+            for key in removed:
+                del self.tasks[key]
+            if removed:
+                self._save()
+
+            for key in current:
+                record = self.tasks.get(key)
+                if record is None:
+                    counts["new"] += 1
+                elif self._fresh(record, now):
+                    counts["unchanged"] += 1
+                else:
+                    counts["refresh"] += 1
+
+        logger.log(4, f"[TaskManifest] {counts['new']} new or changed, {counts['unchanged']} unchanged, "
+                      f"{counts['refresh']} playlists due for a refresh.")
+        return counts
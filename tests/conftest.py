@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+@pytest.fixture(autouse=True)
+def download_dir(tmp_path, monkeypatch):
+    """Every test gets its own DOWNLOAD_DIR (caches, journals and state files live there)."""
+    monkeypatch.setattr(config, "DOWNLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "ENABLE_LOGGING", False)
+    return tmp_path
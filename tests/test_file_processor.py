@@ -0,0 +1,150 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+from mutagen.mp4 import MP4
+
+import config
+import file_processor
+from file_processor import TagUpdate, normalize_lrc, parse_lrc, lrc_to_srt
+
+def _ffmpeg():
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        pytest.skip("ffmpeg is not available")
+
+def _audio_md5(path):
+    """md5 of the audio packets: changes if a chunk offset points at the wrong bytes."""
+    out = subprocess.run([_ffmpeg(), "-v", "error", "-i", path, "-map", "0:a", "-c", "copy", "-f", "md5", "-"],
+                         capture_output=True, text=True, check=True)
+    return out.stdout.strip()
+
+@pytest.fixture(params=["moov_last", "moov_first"])
+def m4a(request, tmp_path):
+    """A 3 s AAC track without tags; moov after mdat (ffmpeg default) or in front (faststart)."""
+    path = str(tmp_path / "track.m4a")
+    args = [_ffmpeg(), "-v", "error", "-f", "lavfi", "-i", "sine=frequency=440:duration=3",
+            "-c:a", "aac", "-b:a", "64k"]
+    if request.param == "moov_first":
+        args += ["-movflags", "+faststart"]
+    subprocess.run(args + [path], check=True)
+    return path
+
+COVER = b"\xff\xd8\xff\xe0" + os.urandom(300 * 1024)  # Bigger than TAG_PADDING
+
+def test_first_tags_rebuild_the_file_and_keep_the_audio(m4a):
+    audio = _audio_md5(m4a)
+    inode = os.stat(m4a).st_ino
+
+    assert TagUpdate(m4a).set_ytid("abc123def45").set_lyrics("la la").commit()
+
+    # No free space in a fresh ffmpeg file: rebuilt through a temp file and swapped in
+    assert os.stat(m4a).st_ino != inode
+    assert not os.path.exists(f"{m4a}.tags.tmp")
+    assert _audio_md5(m4a) == audio
+    tags = MP4(m4a).tags
+    assert tags["\xa9lyr"] == ["la la"]
+    assert bytes(tags[config.YTID_KEY][0]) == b"abc123def45"
+
+def test_small_edits_after_a_rewrite_stay_in_place(m4a):
+    TagUpdate(m4a).set_ytid("abc123def45").commit()
+    audio = _audio_md5(m4a)
+    inode, size = os.stat(m4a).st_ino, os.path.getsize(m4a)
+
+    TagUpdate(m4a).set_lyrics("[00:01.00]la la la\n" * 50).commit()
+
+    assert os.stat(m4a).st_ino == inode
+    assert os.path.getsize(m4a) == size  # Taken from the TAG_PADDING reserve
+    assert _audio_md5(m4a) == audio
+    assert MP4(m4a).tags["\xa9lyr"] == ["[00:01.00]la la la\n" * 50]
+
+def test_growing_past_the_padding_rewrites_and_fixes_chunk_offsets(m4a):
+    TagUpdate(m4a).set_ytid("abc123def45").commit()
+    audio = _audio_md5(m4a)
+    inode = os.stat(m4a).st_ino
+
+    TagUpdate(m4a).set_cover(COVER).commit()
+
+    assert os.stat(m4a).st_ino != inode
+    assert _audio_md5(m4a) == audio
+    assert bytes(MP4(m4a).tags["covr"][0]) == COVER
+
+    # Dropping the cover again fits in place (the freed bytes become padding)
+    inode = os.stat(m4a).st_ino
+    TagUpdate(m4a).remove_cover().commit()
+    assert os.stat(m4a).st_ino == inode
+    assert "covr" not in MP4(m4a).tags
+    assert _audio_md5(m4a) == audio
+
+def test_unchanged_values_never_write(m4a):
+    TagUpdate(m4a).set_ytid("abc123def45").set_lyrics("la la").commit()
+    before = os.stat(m4a)
+
+    TagUpdate(m4a).set_ytid("abc123def45").set_lyrics("la la").commit()
+
+    after = os.stat(m4a)
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+
+def test_fresh_files_grow_in_place_only_when_little_follows_the_tags(m4a, monkeypatch):
+    with open(m4a, "rb") as f:
+        moov_last = file_processor._moov_end(f) == os.path.getsize(m4a)
+    audio = _audio_md5(m4a)
+    inode = os.stat(m4a).st_ino
+
+    # moov last: nothing follows ilst. moov first: the whole mdat does (still below TAG_INPLACE_MAX here)
+    TagUpdate(m4a, fresh=True).set_ytid("abc123def45").commit()
+    assert os.stat(m4a).st_ino == inode
+    assert _audio_md5(m4a) == audio
+
+    # Past the limit the media data is never shifted in place
+    monkeypatch.setattr(config, "TAG_INPLACE_MAX", 0)
+    TagUpdate(m4a, fresh=True).set_cover(COVER).commit()
+    assert (os.stat(m4a).st_ino == inode) == moov_last
+    assert _audio_md5(m4a) == audio
+    assert bytes(MP4(m4a).tags["covr"][0]) == COVER
+
+# --- LRC ---
+
+def test_parse_lrc_splits_multi_stamp_lines_and_sorts():
+    entries, headers = parse_lrc("[ar:Someone]\n[00:20.00][00:05.50]chorus\n[00:10.00]verse\n")
+    assert entries == [(5500, "chorus"), (10000, "verse"), (20000, "chorus")]
+    assert headers == {"ar": "Someone"}
+
+def test_parse_lrc_stamp_formats():
+    entries, _ = parse_lrc("[01:02]a\n[01:02:5]b\n[01:02.345]c\n[01:02.3456]d\n")
+    assert [ms for ms, _ in entries] == [62000, 62345, 62345, 62500]
+
+def test_parse_lrc_offset_shifts_line_and_word_stamps():
+    entries, _ = parse_lrc("[offset:+500]\n[00:01.00]<00:01.00>la <00:01.40>la\n[00:00.20]intro\n")
+    # Positive offset: the lyrics come earlier, clamped at zero
+    assert entries == [(0, "intro"), (500, "<00:00.50>la <00:00.90>la")]
+
+def test_parse_lrc_handles_crlf_headers_and_keeps_blank_markers():
+    entries, headers = parse_lrc("[ti:Song]\r\n[offset:-1000]\r\n[00:01.00]one\r\n[00:03.00]\r\n")
+    assert headers == {"ti": "Song", "offset": "-1000"}
+    assert entries == [(2000, "one"), (4000, "")]
+
+def test_parse_lrc_ignores_bad_offsets_and_plain_text():
+    assert parse_lrc("[offset:soon]\n[00:01.00]a\n")[0] == [(1000, "a")]
+    assert parse_lrc("no stamps here") == ([], {})
+    assert parse_lrc(None) == ([], {})
+
+def test_normalize_lrc_applies_the_offset_and_drops_the_header():
+    text = "[ar:Someone]\n[offset:250]\n[00:02.00][00:01.00]<00:01.00>hey\n"
+    assert normalize_lrc(text) == "[ar:Someone]\n[00:00.75]<00:00.75>hey\n[00:01.75]<00:00.75>hey\n"
+    # Already normalized text comes back unchanged
+    assert normalize_lrc(normalize_lrc(text)) == normalize_lrc(text)
+
+def test_normalize_lrc_leaves_plain_lyrics_alone():
+    assert normalize_lrc("just words\nmore words") == "just words\nmore words"
+
+def test_lrc_to_srt_drops_word_stamps_and_blank_markers():
+    srt = lrc_to_srt("[00:01.00]<00:01.00>one <00:01.50>two\n[00:03.00]\n[00:05.00]three\n")
+    assert srt == ("1\n00:00:01,000 --> 00:00:03,000\none two\n"
+                   "\n2\n00:00:05,000 --> 00:00:09,000\nthree\n")
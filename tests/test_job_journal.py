@@ -0,0 +1,87 @@
+import os
+from types import SimpleNamespace
+
+import job_journal
+from job_journal import JobJournal, artifacts, discard, prepare_resume
+
+def _touch(directory, *names):
+    paths = []
+    for name in names:
+        path = os.path.join(directory, name)
+        with open(path, "wb") as f:
+            f.write(b"x")
+        paths.append(path)
+    return paths
+
+def _job(ytid="abc123def45"):
+    return SimpleNamespace(ytid=ytid, entry={"id": ytid, "title": "Song", "extra": "dropped"},
+                           original_query="artist - song", output_path="out", override_mode=None,
+                           artist="Artist", title="Song", duration=200, album=None, yt_thumb=None, files=[])
+
+def test_artifacts_matches_only_unfinished_files(tmp_path):
+    final = str(tmp_path / "Artist - Song.m4a")
+    part, frag, ytdl, temp, other_format, lrc, other_track = _touch(
+        tmp_path, "Artist - Song.m4a.part", "Artist - Song.f140.m4a.part-Frag3", "Artist - Song.f140.m4a.ytdl",
+        "Artist - Song.temp.m4a", "Artist - Song.webm", "Artist - Song.lrc", "Artist - Song (Live).m4a.part")
+
+    assert sorted(artifacts(final)) == sorted([part, frag, ytdl, temp])
+    assert artifacts(final, resumable=True) == [temp]
+    assert sorted(artifacts(final, keep={part})) == sorted([frag, ytdl, temp])
+
+def test_journal_tracks_a_job_across_reloads(download_dir):
+    journal = JobJournal()
+    journal.begin(_job())
+    journal.start_format("abc123def45", "m4a", "/music/Song.m4a")
+    journal.intermediate("abc123def45", "/music/Song.webm")
+    journal.intermediate("abc123def45", "/music/Song.webm")
+
+    [(ytid, record)] = JobJournal().pending()
+    assert ytid == "abc123def45"
+    assert record["stage"] == "downloading"
+    assert record["entry"] == {"id": "abc123def45", "title": "Song"}
+    assert record["inflight"] == {"m4a": "/music/Song.m4a"}
+    assert record["intermediates"] == ["/music/Song.webm"]
+
+    journal.finish_format("abc123def45", "m4a", "/music/Song.m4a")
+    journal.downloaded("abc123def45")
+    assert journal.attempt("abc123def45") == 1
+    [(_, record)] = JobJournal().pending()
+    assert record["stage"] == "downloaded"
+    assert record["inflight"] == {}
+    assert record["files"] == [["m4a", "/music/Song.m4a"]]
+
+    # Picked up again after a crash: the attempt count and intermediates survive begin()
+    journal.begin(_job())
+    assert journal.attempt("abc123def45") == 2
+    assert journal.pending()[0][1]["intermediates"] == ["/music/Song.webm"]
+
+    journal.finish("abc123def45")
+    assert JobJournal().pending() == []
+
+def test_unreadable_journal_starts_fresh(download_dir):
+    journal = JobJournal()
+    with open(journal.path, "w") as f:
+        f.write('{"abc123def45": {"st')
+    assert JobJournal().pending() == []
+
+def test_prepare_resume_keeps_what_yt_dlp_can_continue(tmp_path):
+    done, half, part, temp, source = _touch(
+        tmp_path, "Song.mp4", "Song.m4a", "Song.m4a.part", "Song.temp.m4a", "Song.webm")
+    record = {"files": [["mp4", done]], "inflight": {"m4a": half}, "intermediates": [source]}
+
+    prepare_resume(record)
+
+    assert sorted(os.listdir(tmp_path)) == ["Song.m4a.part", "Song.mp4", "Song.webm"]
+
+def test_discard_removes_partials_and_intermediates_but_not_finished_formats(tmp_path):
+    done, half, part, temp, source, lrc = _touch(
+        tmp_path, "Song.mp4", "Song.m4a", "Song.m4a.part", "Song.temp.m4a", "Song.webm", "Song.lrc")
+    record = {"files": [["mp4", done]], "inflight": {"m4a": half}, "intermediates": [source, done]}
+
+    discard(record)
+
+    assert sorted(os.listdir(tmp_path)) == ["Song.lrc", "Song.mp4"]
+
+def test_artifact_pattern_rejects_other_tracks():
+    assert job_journal.ARTIFACT_RE.match(".f137.mp4.part-Frag12")
+    assert not job_journal.ARTIFACT_RE.match(" (Live).m4a.part")
@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import config
+import lyrics_engine
+import rate_limiter
+
+# Every provider URL points at one local stub server; the first path segment names the URL key
+URL_KEYS = {
+    "LRCLIB": ["LRCLIB_URL"],
+    "NetEase": ["NETEASE_SEARCH_URL", "NETEASE_LYRIC_URL"],
+    "QQ Music": ["QQ_SEARCH_URL", "QQ_LYRIC_URL"],
+    "Megalyrics": ["MEGALYRICS_URL"],
+    "Gecimi": ["GECIMI_URL"],
+    "Lyrics.ovh": ["OVH_URL"],
+}
+HIT = {
+    "LRCLIB_URL": (200, json.dumps({"syncedLyrics": "[00:01.00]from lrclib"})),
+    "OVH_URL": (200, json.dumps({"lyrics": "[00:01.00]from ovh"})),
+}
+MISS = {
+    "LRCLIB_URL": (404, "{}"),
+    "NETEASE_SEARCH_URL": (200, "{}"),
+    "QQ_SEARCH_URL": (200, "{}"),
+    "MEGALYRICS_URL": (200, "<r/>"),
+    "GECIMI_URL": (200, "{}"),
+    "OVH_URL": (404, "{}"),
+}
+
+class Stub:
+    """behaviour: {provider: ('hit' | 'miss' | 'hang', delay seconds)}; anything else misses at once."""
+    def __init__(self):
+        self.behaviour = {}
+        self.requests = Counter()
+        self.received = []
+        self._lock = threading.Lock()
+        self._release = threading.Event()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                key = self.path.split("/")[1].split("?")[0]
+                name = next(n for n, keys in URL_KEYS.items() if key in keys)
+                with stub._lock:
+                    stub.requests[name] += 1
+                    stub.received.append(time.monotonic())
+                kind, delay = stub.behaviour.get(name, ("miss", 0))
+                stub._release.wait(30 if kind == "hang" else delay)
+                status, body = (HIT if kind == "hit" else MISS)[key]
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body.encode())
+                except OSError:
+                    pass  # The client gave up
+
+            do_POST = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, key):
+        return f"http://127.0.0.1:{self.server.server_port}/{key}"
+
+    def close(self):
+        self._release.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub = Stub()
+    for keys in URL_KEYS.values():
+        for key in keys:
+            monkeypatch.setattr(config, key, stub.url(key))
+    monkeypatch.setattr(config, "LYRICS_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "LYRICS_HEDGE_DELAY", 0.2)
+    monkeypatch.setattr(config, "LYRICS_PROVIDER_TIMEOUT", 1.5)
+    monkeypatch.setattr(config, "LYRICS_SEARCH_DEADLINE", 5)
+    yield stub
+    stub.close()
+
+@pytest.fixture
+def host_rate():
+    """Sets the stub host's (requests/s, burst) on the shared limiter; unlimited by default."""
+    limiter = rate_limiter.get_limiter()
+    def set_rate(rate):
+        limiter.rates["127.0.0.1"] = rate
+        limiter._buckets.pop("127.0.0.1", None)
+    set_rate((1000.0, 1000))
+    yield set_rate
+    limiter.rates.pop("127.0.0.1", None)
+    limiter._buckets.pop("127.0.0.1", None)
+
+@pytest.fixture
+def engine(stub, host_rate):
+    engine = lyrics_engine.LyricsEngine()
+    yield engine
+    engine._executor.shutdown(wait=False, cancel_futures=True)
+
+def test_quick_top_answer_asks_nobody_else(stub, engine):
+    stub.behaviour = {"LRCLIB": ("hit", 0.05)}
+    assert engine.lookup("Artist", "Song", 200) == ("[00:01.00]from lrclib", "LRCLIB")
+    assert sum(stub.requests.values()) == 1
+
+def test_misses_fall_through_to_the_last_provider(stub, engine):
+    stub.behaviour = {"Lyrics.ovh": ("hit", 0)}
+    start = time.monotonic()
+    assert engine.lookup("Artist", "Song", 200) == ("[00:01.00]from ovh", "Lyrics.ovh")
+    # A miss starts the next provider at once, not after the hedge delay
+    assert time.monotonic() - start < config.LYRICS_HEDGE_DELAY * 2
+    assert set(stub.requests) == set(URL_KEYS)
+
+def test_slower_higher_ranked_answer_wins_like_the_serial_search(stub, engine, monkeypatch):
+    stub.behaviour = {"LRCLIB": ("hit", 0.6), "Lyrics.ovh": ("hit", 0)}
+    assert engine.lookup("Artist", "Song", 200) == ("[00:01.00]from lrclib", "LRCLIB")
+    assert stub.requests["Lyrics.ovh"] == 1  # Hedged: asked while LRCLIB was still thinking
+
+    monkeypatch.setattr(config, "LYRICS_RACE", False)
+    assert engine.lookup("Artist", "Song", 200) == ("[00:01.00]from lrclib", "LRCLIB")
+
+def test_hung_provider_is_given_up_after_its_timeout(stub, engine):
+    stub.behaviour = {"LRCLIB": ("hang", 0), "Lyrics.ovh": ("hit", 0)}
+    start = time.monotonic()
+    assert engine.lookup("Artist", "Song", 200) == ("[00:01.00]from ovh", "Lyrics.ovh")
+    assert time.monotonic() - start < config.LYRICS_PROVIDER_TIMEOUT + 1
+
+    # The hung call doesn't keep a provider thread
+    drained = time.monotonic()
+    engine._executor.shutdown(wait=True)
+    assert time.monotonic() - drained < 1
+
+def test_rate_limited_host_bounds_abandoned_calls(stub, engine, host_rate, monkeypatch):
+    monkeypatch.setattr(config, "LYRICS_SEARCH_DEADLINE", 2)
+    host_rate((1.0, 1))
+    stub.behaviour = {name: ("miss", 0.05) for name in URL_KEYS}
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=engine.lookup, args=("Artist", f"Song {i}", 200)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    returned = time.monotonic()
+    assert returned - start < 2 + 1  # Searches end at the deadline
+
+    # Calls the race gave up on stop waiting for tokens and send nothing afterwards
+    engine._executor.shutdown(wait=True)
+    assert time.monotonic() - returned < 1
+    time.sleep(0.3)
+    assert not [t for t in stub.received if t > returned + 0.1]
@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+import config
+from registry import Registry
+
+@pytest.fixture
+def open_registry():
+    """Registry factory; every instance is closed (flush thread stopped) after the test."""
+    opened = []
+    def make():
+        registry = Registry()
+        opened.append(registry)
+        return registry
+    yield make
+    for registry in opened:
+        registry.close()
+
+def _journal(registry):
+    with open(registry.journal_path) as f:
+        return [json.loads(line) for line in f]
+
+def test_entries_are_buffered_then_journaled_and_replayed(open_registry):
+    registry = open_registry()
+    registry.add("artist - song", "abc123def45")
+    assert registry.is_downloaded("artist - song")
+    assert not os.path.exists(registry.journal_path)  # Group commit: nothing written yet
+
+    registry.flush()
+    assert _journal(registry) == [{"q": "artist - song", "id": "abc123def45"}]
+
+    reloaded = open_registry()
+    assert reloaded.lookup("artist - song") == "abc123def45"
+    assert reloaded.lookup("abc123def45") == "abc123def45"
+    assert reloaded.lookup("other") is None
+
+def test_save_flushes_after_enough_entries(open_registry, monkeypatch):
+    monkeypatch.setattr(config, "REGISTRY_FLUSH_EVERY", 2)
+    monkeypatch.setattr(config, "REGISTRY_FLUSH_INTERVAL", 3600)
+    registry = open_registry()
+    registry.add("a", "id_a")
+    registry.save()
+    assert not os.path.exists(registry.journal_path)
+    registry.add("b", "id_b")
+    registry.save()
+    assert [entry["id"] for entry in _journal(registry)] == ["id_a", "id_b"]
+
+def test_torn_journal_line_is_skipped_and_compacted_away(open_registry):
+    path = os.path.join(config.DOWNLOAD_DIR, config.REGISTRY_FILE)
+    with open(path + ".journal", "w") as f:
+        f.write(json.dumps({"q": "a", "id": "id_a"}) + "\n")
+        f.write('{"q": "b", "i')  # Killed mid-write
+
+    registry = open_registry()
+
+    assert registry.lookup("a") == "id_a"
+    assert registry.lookup("b") is None
+    # Compacted at once, so the next append doesn't land after the torn line
+    assert not os.path.exists(registry.journal_path)
+    with open(path) as f:
+        assert json.load(f) == {"ids": ["id_a"], "queries": {"a": "id_a"}}
+
+    registry.add("c", "id_c")
+    registry.flush()
+    assert open_registry().lookup("c") == "id_c"
+
+def test_journal_is_folded_into_the_snapshot(open_registry, monkeypatch):
+    monkeypatch.setattr(config, "REGISTRY_COMPACT_EVERY", 3)
+    registry = open_registry()
+    for i in range(2):
+        registry.add(f"q{i}", f"id{i}")
+    registry.flush()
+    assert len(_journal(registry)) == 2
+
+    registry.add("q2", "id2")
+    registry.flush()
+
+    assert not os.path.exists(registry.journal_path)
+    with open(registry.path) as f:
+        snapshot = json.load(f)
+    assert snapshot["ids"] == ["id0", "id1", "id2"]
+    assert not os.path.exists(registry.path + ".tmp")
+    assert open_registry().lookup("q1") == "id1"
+
+def test_unreadable_snapshot_is_kept_aside(open_registry):
+    path = os.path.join(config.DOWNLOAD_DIR, config.REGISTRY_FILE)
+    with open(path, "w") as f:
+        f.write("{not json")
+
+    registry = open_registry()
+
+    assert registry.data == {"ids": set(), "queries": {}}
+    assert not os.path.exists(path)
+    assert any(name.startswith(config.REGISTRY_FILE + ".corrupt-") for name in os.listdir(config.DOWNLOAD_DIR))
+
+def test_sync_with_disk_drops_missing_ids_and_playlists(open_registry):
+    registry = open_registry()
+    registry.add("kept", "id_kept")
+    registry.add("gone", "id_gone")
+    registry.add("https://youtube.com/playlist?list=PL1", "id_kept")
+    registry.flush()
+
+    registry.sync_with_disk({"id_kept"})
+
+    assert registry.data["queries"] == {"kept": "id_kept"}
+    assert registry.data["ids"] == {"id_kept"}
+    assert open_registry().data["queries"] == {"kept": "id_kept"}
@@ -0,0 +1,73 @@
+import threading
+import yt_dlp
+from yt_dlp.postprocessor.common import PostProcessor
+import file_processor
+
+# Nested lists yt-dlp may annotate in place while downloading (the dicts inside are copied)
+NESTED_KEYS = ('requested_formats', 'thumbnails')
+
+def isolate_info(video):
+    """
+    Cheap per-format copy of an info dict.
+    yt-dlp and its post-processors only overwrite top-level keys (ext, filepath,
+    __files_to_move, ...), so a shallow copy plus fresh copies of the few nested
+    lists it touches is enough. Internal '__' state from an earlier format is dropped.
+    """
+    info = {k: v for k, v in video.items() if not k.startswith('__') and k not in ('filepath', '_filename')}
+    for key in NESTED_KEYS:
+        if isinstance(info.get(key), list):
+            info[key] = [dict(item) if isinstance(item, dict) else item for item in info[key]]
+    return info
+
+class EmbedTagsPP(PostProcessor):
+    """
+    Last post-processor of an audio download: writes lyrics, YTID and cover
+    into the file FFmpeg just produced, before yt-dlp hands it over.
+    The track's TrackJob travels in info['__tag_job']; files written here are
+    added to job.tagged so the tag stage doesn't open them again.
+    """
+    def run(self, info):
+        job = info.get('__tag_job')
+        path = info.get('filepath')
+        if job and path and path.endswith('.m4a'):
+            if file_processor.embed_metadata(path, lyrics=job.lyrics, ytid=job.ytid, cover_data=job.cover_data,
+                                             fresh=True):
+                job.tagged.add(path)
+        return [], info
+
+class FormatPool:
+    """
+    One YoutubeDL per (output folder, format) per thread, built on first use
+    and reused for every later track (YoutubeDL isn't safe to share between threads).
+    opts_factory(fmt, output_path) returns the options for a new instance,
+    setup(ydl, fmt) (optional) can attach post-processors to it.
+    """
+    def __init__(self, opts_factory, setup=None):
+        self.opts_factory = opts_factory
+        self.setup = setup
+        self._local = threading.local()
+        self._instances = []
+        self._lock = threading.Lock()
+
+    def get(self, fmt, output_path):
+        cache = getattr(self._local, 'ydls', None)
+        if cache is None:
+            cache = self._local.ydls = {}
+
+        key = (output_path, fmt)
+        ydl = cache.get(key)
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL(self.opts_factory(fmt, output_path))
+            if self.setup:
+                self.setup(ydl, fmt)
+            cache[key] = ydl
+            with self._lock:
+                self._instances.append(ydl)
+        return ydl
+
+    def close(self):
+        with self._lock:
+            for ydl in self._instances:
+                try: ydl.close()
+                except Exception: pass
+            self._instances = []